@@ -0,0 +1,110 @@
+"""
+End-of-day auto-checkout.
+
+Visitors who leave without checking out would otherwise stay "Currently
+Inside" forever. Once a day, at AUTO_CHECKOUT_AT (IST), every open visit
+is checked out in batches and flagged checkout_auto=1.
+
+    python auto_checkout.py           # run the daily scheduler
+    python auto_checkout.py --now     # sweep once and exit
+"""
+import logging
+import os
+import sys
+import threading
+from datetime import datetime, time, timedelta
+
+import db
+import read_cache
+from ist_time import ZONE_IST
+from occupancy import registry as occupancy
+
+
+# =====================================================
+# CONFIG
+# =====================================================
+AUTO_CHECKOUT_AT = time.fromisoformat(os.environ.get("WHEELBRAND_AUTO_CHECKOUT_AT", "23:00"))
+BATCH_SIZE = 500
+
+# Run the scheduler inside the Streamlit process (single-server deployments)
+AUTO_CHECKOUT_INPROCESS = os.environ.get("WHEELBRAND_AUTO_CHECKOUT_INPROCESS") == "1"
+
+log = logging.getLogger(__name__)
+
+
+# =====================================================
+# SWEEP
+# =====================================================
+def sweep(batch_size=BATCH_SIZE):
+    """Check out every visit still open. Returns the number closed."""
+    total = 0
+    while True:
+        batch = db.fetch_all("""
+            SELECT visitor_id, company_id
+            FROM visitors
+            WHERE checkout_time IS NULL AND pass_generated=1
+            ORDER BY visitor_id
+            LIMIT %s
+        """, (batch_size,))
+        if not batch:
+            return total
+
+        ids = [r["visitor_id"] for r in batch]
+        marks = ", ".join(["%s"] * len(ids))
+        _, closed = db.execute(f"""
+            UPDATE visitors
+            SET checkout_time=NOW(), checkout_auto=1
+            WHERE checkout_time IS NULL AND visitor_id IN ({marks})
+        """, ids)
+        total += closed
+
+        by_company = {}
+        for r in batch:
+            by_company.setdefault(r["company_id"], []).append(r["visitor_id"])
+        for company_id, visitor_ids in by_company.items():
+            read_cache.invalidate("visitors", company_id)
+            occupancy.check_out(company_id, visitor_ids)
+
+        if len(batch) < batch_size:
+            return total
+
+
+def next_run(now=None):
+    now = now or datetime.now(ZONE_IST)
+    at = datetime.combine(now.date(), AUTO_CHECKOUT_AT, tzinfo=ZONE_IST)
+    return at if at > now else at + timedelta(days=1)
+
+
+def run_scheduler(stop_event=None):
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
+        wait = (next_run() - datetime.now(ZONE_IST)).total_seconds()
+        if stop_event.wait(max(wait, 0)):
+            return
+        try:
+            log.info("Auto-checked-out %s visitors", sweep())
+        except Exception as e:
+            log.error("Auto-checkout sweep failed: %s", e)
+
+
+_scheduler_thread = None
+_scheduler_lock = threading.Lock()
+
+
+def start_background_scheduler():
+    """Run the daily sweep in a daemon thread, if configured for this process."""
+    global _scheduler_thread
+    if not AUTO_CHECKOUT_INPROCESS:
+        return
+    with _scheduler_lock:
+        if _scheduler_thread is None:
+            _scheduler_thread = threading.Thread(target=run_scheduler, name="auto-checkout", daemon=True)
+            _scheduler_thread.start()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if "--now" in sys.argv[1:]:
+        log.info("Auto-checked-out %s visitors", sweep())
+    else:
+        run_scheduler()
@@ -0,0 +1,302 @@
+import bisect
+import functools
+from datetime import timedelta
+
+import mysql.connector
+from mysql.connector import errorcode
+
+import db
+from booking_recurrence import (
+    CHECK_HORIZON, as_time, company_occurrences, get_company_series, last_date,
+    occurrence_dates, occurrence_row, occurs_on,
+)
+
+
+# =====================================================
+# ERRORS
+# =====================================================
+class BookingError(Exception):
+    """Booking rejected (invalid times or a clash with an existing booking)."""
+
+
+class BookingConflict(BookingError):
+    def __init__(self, conflict):
+        self.conflict = conflict
+        super().__init__(
+            f"Slot already booked: {conflict['start_time'].strftime('%I:%M %p')} - "
+            f"{conflict['end_time'].strftime('%I:%M %p')}"
+            + (f" on {conflict['booking_date'].strftime('%d-%m-%Y')}" if conflict.get("booking_date") else "")
+            + (f" ({conflict['purpose']})" if conflict.get("purpose") else "")
+        )
+
+
+DEADLOCK_RETRIES = 1
+
+
+def validate_times(start, end):
+    if end <= start:
+        raise BookingError("End time must be after start time.")
+
+
+# =====================================================
+# IN-MEMORY INDEX
+# =====================================================
+class IntervalIndex:
+    """
+    Bookings of one day kept sorted by start time, for O(log n) overlap
+    checks. Intervals are half-open, so back-to-back bookings don't clash.
+    """
+
+    def __init__(self, rows=()):
+        rows = sorted(rows, key=lambda r: r["start_time"])
+        self._starts = [r["start_time"] for r in rows]
+        self._rows = rows
+        self._max_ends = []
+        self._refresh_max_ends(0)
+
+    def _refresh_max_ends(self, i):
+        # _max_ends[j] is the latest end among rows[:j + 1]
+        del self._max_ends[i:]
+        latest = self._max_ends[-1] if self._max_ends else None
+        for row in self._rows[i:]:
+            if latest is None or row["end_time"] > latest:
+                latest = row["end_time"]
+            self._max_ends.append(latest)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def add(self, row):
+        i = bisect.bisect_right(self._starts, row["start_time"])
+        self._starts.insert(i, row["start_time"])
+        self._rows.insert(i, row)
+        self._refresh_max_ends(i)
+
+    def find_overlap(self, start, end, ignore_id=None):
+        """First booking overlapping [start, end), or None."""
+        # Everything up to j starts before `end`. Rows stored before the
+        # overlap check existed may overlap each other, so walk left until
+        # no earlier row can still be running at `start`.
+        j = bisect.bisect_left(self._starts, end) - 1
+        while j >= 0 and self._max_ends[j] > start:
+            row = self._rows[j]
+            if row["id"] != ignore_id and row["end_time"] > start:
+                return row
+            j -= 1
+        return None
+
+
+# =====================================================
+# TRANSACTIONAL WRITES
+# =====================================================
+def lock_company(cur, company, exclusive=False):
+    """
+    Company-wide lock row. Single-day writers hold it shared, so they only
+    serialize on their day lock; a new series spans many days and takes it
+    exclusively. Always taken before any day lock.
+    """
+    # An existing row hit by INSERT IGNORE is share-locked; upgrading that
+    # to FOR UPDATE deadlocks two exclusive writers, so the exclusive path
+    # takes the row lock directly with ON DUPLICATE KEY UPDATE.
+    if exclusive:
+        cur.execute(
+            "INSERT INTO booking_company_locks (company) VALUES (%s) "
+            "ON DUPLICATE KEY UPDATE company=company",
+            (company,)
+        )
+        return
+    cur.execute("INSERT IGNORE INTO booking_company_locks (company) VALUES (%s)", (company,))
+    cur.execute(
+        "SELECT company FROM booking_company_locks WHERE company=%s LOCK IN SHARE MODE",
+        (company,)
+    )
+    cur.fetchall()
+
+
+def lock_day(cur, company, day):
+    """Serialize writers for one company-day on its booking_day_locks row."""
+    cur.execute(
+        "INSERT INTO booking_day_locks (company, booking_date) VALUES (%s, %s) "
+        "ON DUPLICATE KEY UPDATE company=company",
+        (company, day)
+    )
+
+
+def retry_deadlock(fn):
+    """
+    Re-run a locking transaction that InnoDB picked as a deadlock victim;
+    if it loses again the caller gets a BookingError, not a driver error.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        for attempt in range(DEADLOCK_RETRIES + 1):
+            try:
+                return fn(*args, **kwargs)
+            except mysql.connector.Error as e:
+                if e.errno != errorcode.ER_LOCK_DEADLOCK:
+                    raise
+                if attempt == DEADLOCK_RETRIES:
+                    raise BookingError("Another booking was saved at the same moment. Please try again.") from e
+    return wrapper
+
+
+def resolve_room(cur, company, room_id):
+    """
+    The implicit room (None) only exists while the company has no rooms;
+    after that it is the first room, which adopted its bookings
+    (room_availability.adopt_implicit_bookings).
+    """
+    if room_id is not None:
+        return room_id
+    cur.execute(
+        "SELECT MIN(id) AS id FROM conference_rooms WHERE company=%s AND is_active=1",
+        (company,)
+    )
+    return cur.fetchone()["id"]
+
+
+def _day_index(cur, company, day, room_id):
+    # room_id NULL is the implicit single room of companies without rooms.
+    cur.execute("""
+        SELECT b.id, b.start_time, b.end_time, b.purpose
+        FROM conference_users u
+        JOIN conference_bookings b ON b.user_id=u.id
+        WHERE u.company=%s AND b.booking_date=%s AND b.room_id <=> %s
+    """, (company, day, room_id))
+    rows = cur.fetchall()
+    rows += [
+        occ for occ in company_occurrences(company, day, day + timedelta(days=1), cur=cur)
+        if occ["room_id"] == room_id
+    ]
+    return IntervalIndex(rows)
+
+
+@retry_deadlock
+def insert_booking(uid, company, d, s, e, dept, purpose, room_id=None,
+                   room_auto=False, attendees=None):
+    """
+    Insert a booking unless it overlaps another one in the room. Returns the
+    new id. room_auto marks rooms picked by the allocator, which it may move.
+    """
+    validate_times(s, e)
+
+    with db.transaction(dictionary=True) as cur:
+        lock_company(cur, company)
+        lock_day(cur, company, d)
+        room_id = resolve_room(cur, company, room_id)
+
+        clash = _day_index(cur, company, d, room_id).find_overlap(s, e)
+        if clash:
+            raise BookingConflict(clash)
+
+        cur.execute("""
+            INSERT INTO conference_bookings
+                (user_id, room_id, room_auto, attendees,
+                 booking_date, start_time, end_time, department, purpose)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, (uid, room_id, int(room_auto), attendees, d, s, e, dept, purpose))
+        return cur.lastrowid
+
+
+@retry_deadlock
+def move_booking(bid, uid, company, d, s, e, room_id=None):
+    """Change a booking's times unless the new slot overlaps another booking in the room."""
+    validate_times(s, e)
+
+    with db.transaction(dictionary=True) as cur:
+        lock_company(cur, company)
+        lock_day(cur, company, d)
+        room_id = resolve_room(cur, company, room_id)
+
+        clash = _day_index(cur, company, d, room_id).find_overlap(s, e, ignore_id=bid)
+        if clash:
+            raise BookingConflict(clash)
+
+        cur.execute("""
+            UPDATE conference_bookings
+            SET start_time=%s, end_time=%s, room_id=%s
+            WHERE id=%s AND user_id=%s
+        """, (s, e, room_id, bid, uid))
+
+
+def _overlaps_time(a_start, a_end, b_start, b_end):
+    return a_start < b_end and b_start < a_end
+
+
+def _series_clash(cur, company, series):
+    """
+    First booking or series occurrence the new series would overlap, found
+    without materializing the series: single bookings are narrowed in SQL by
+    room and time of day and then tested with occurs_on(); other series are
+    walked lazily only over the dates both can occur on.
+    """
+    first = series["start_date"]
+    last = series["last_date"] or first + CHECK_HORIZON
+    window_end = last + timedelta(days=1)
+    s_at, e_at = series["start_at"], series["end_at"]
+
+    cur.execute("""
+        SELECT b.id, b.booking_date, b.start_time, b.end_time, b.purpose
+        FROM conference_users u
+        JOIN conference_bookings b ON b.user_id=u.id
+        WHERE u.company=%s AND b.room_id <=> %s
+          AND b.booking_date >= %s AND b.booking_date <= %s
+          AND TIME(b.start_time) < %s AND TIME(b.end_time) > %s
+        ORDER BY b.booking_date
+    """, (company, series["room_id"], first, last, e_at, s_at))
+    for row in cur.fetchall():
+        if occurs_on(series, row["booking_date"]):
+            return row
+
+    for other in get_company_series(company, first, window_end, cur=cur):
+        if other["room_id"] != series["room_id"]:
+            continue
+        if not _overlaps_time(s_at, e_at, as_time(other["start_at"]), as_time(other["end_at"])):
+            continue
+        lo = max(first, other["start_date"])
+        hi = min(window_end, (other["last_date"] or last) + timedelta(days=1))
+        for day in occurrence_dates(series, lo, hi):
+            if occurs_on(other, day, other["exceptions"]):
+                return occurrence_row(other, day)
+    return None
+
+
+@retry_deadlock
+def insert_series(uid, company, series, dept, purpose):
+    """
+    Store a recurring booking once, unless any of its occurrences overlaps a
+    booking or another series in the room. `series` holds room_id, freq,
+    interval_n, start_date, until_date / occurrence_count and start_at /
+    end_at (times of day). Returns the new series id.
+    """
+    if series["end_at"] <= series["start_at"]:
+        raise BookingError("End time must be after start time.")
+    if not series.get("until_date") and not series.get("occurrence_count"):
+        raise BookingError("A repeating booking needs an end date or a number of occurrences.")
+
+    series = dict(series, last_date=last_date(series))
+    if series["last_date"] is not None and series["last_date"] < series["start_date"]:
+        raise BookingError("The repeat end date is before the first booking.")
+
+    with db.transaction(dictionary=True) as cur:
+        lock_company(cur, company, exclusive=True)
+        series["room_id"] = resolve_room(cur, company, series["room_id"])
+
+        clash = _series_clash(cur, company, series)
+        if clash:
+            raise BookingConflict(clash)
+
+        cur.execute("""
+            INSERT INTO conference_booking_series
+                (user_id, room_id, department, purpose, freq, interval_n,
+                 start_date, until_date, occurrence_count, last_date, start_at, end_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, (
+            uid, series["room_id"], dept, purpose, series["freq"], series["interval_n"],
+            series["start_date"], series.get("until_date"), series.get("occurrence_count"),
+            series["last_date"], series["start_at"], series["end_at"],
+        ))
+        return cur.lastrowid
@@ -0,0 +1,244 @@
+"""
+Recurring conference bookings.
+
+A series is stored once (conference_booking_series) with a daily / weekly /
+monthly rule, an until date or an occurrence count, and skipped dates
+(conference_booking_exceptions). Occurrences are never written as rows:
+they are generated lazily for whatever date window is being looked at, and
+the n-th occurrence is computed arithmetically, so "does the series hit
+this day?" is O(1) without walking the series.
+"""
+from calendar import monthrange
+from datetime import date, datetime, timedelta
+
+import db
+
+
+# =====================================================
+# CONFIG
+# =====================================================
+FREQUENCIES = ("daily", "weekly", "monthly")
+
+# Open-ended series are conflict-checked this far ahead.
+CHECK_HORIZON = timedelta(days=366)
+
+SERIES_COLUMNS = """
+    s.id, s.user_id, s.room_id, s.department, s.purpose,
+    s.freq, s.interval_n, s.start_date, s.until_date, s.occurrence_count,
+    s.last_date, s.start_at, s.end_at
+"""
+
+
+# =====================================================
+# RULE ARITHMETIC
+# =====================================================
+def as_time(v):
+    # mysql.connector returns TIME columns as timedelta.
+    if isinstance(v, timedelta):
+        return (datetime.min + v).time()
+    return v
+
+
+def _add_months(d, months):
+    y, m = divmod(d.month - 1 + months, 12)
+    y += d.year
+    m += 1
+    # The 31st of a short month falls back to the month's last day.
+    return d.replace(year=y, month=m, day=min(d.day, monthrange(y, m)[1]))
+
+
+def nth_date(series, n):
+    """Date of occurrence n (0-based), ignoring bounds and exceptions."""
+    step = series["interval_n"] * n
+    if series["freq"] == "monthly":
+        return _add_months(series["start_date"], step)
+    if series["freq"] == "weekly":
+        return series["start_date"] + timedelta(weeks=step)
+    return series["start_date"] + timedelta(days=step)
+
+
+def _first_index_on_or_after(series, d):
+    start = series["start_date"]
+    if d <= start:
+        return 0
+
+    if series["freq"] == "monthly":
+        months = (d.year - start.year) * 12 + (d.month - start.month)
+        n = max(months // series["interval_n"] - 1, 0)
+        while nth_date(series, n) < d:
+            n += 1
+        return n
+
+    days = 7 if series["freq"] == "weekly" else 1
+    step = days * series["interval_n"]
+    return -(-(d - start).days // step)
+
+
+def _in_bounds(series, n, d):
+    if series.get("occurrence_count") and n >= series["occurrence_count"]:
+        return False
+    if series.get("until_date") and d > series["until_date"]:
+        return False
+    return True
+
+
+def last_date(series):
+    """Last occurrence date, or None for an open-ended series."""
+    count, until = series.get("occurrence_count"), series.get("until_date")
+    if count:
+        last = nth_date(series, count - 1)
+        return min(last, until) if until else last
+    return until
+
+
+def occurrence_dates(series, window_start, window_end, exceptions=()):
+    """Lazily yield the series' dates in [window_start, window_end)."""
+    n = _first_index_on_or_after(series, window_start)
+    while True:
+        d = nth_date(series, n)
+        if d >= window_end or not _in_bounds(series, n, d):
+            return
+        if d not in exceptions:
+            yield d
+        n += 1
+
+
+def occurs_on(series, d, exceptions=()):
+    if d < series["start_date"] or d in exceptions:
+        return False
+    n = _first_index_on_or_after(series, d)
+    return nth_date(series, n) == d and _in_bounds(series, n, d)
+
+
+def occurrence_row(series, d):
+    """One occurrence, shaped like a conference_bookings row."""
+    row = {
+        "id": f"s{series['id']}:{d.isoformat()}",
+        "series_id": series["id"],
+        "user_id": series["user_id"],
+        "room_id": series["room_id"],
+        "booking_date": d,
+        "start_time": datetime.combine(d, as_time(series["start_at"])),
+        "end_time": datetime.combine(d, as_time(series["end_at"])),
+        "department": series["department"],
+        "purpose": series["purpose"],
+    }
+    for extra in ("booked_by", "user_department"):
+        if extra in series:
+            row[extra] = series[extra]
+    return row
+
+
+def describe(series):
+    unit = {"daily": "day", "weekly": "week", "monthly": "month"}[series["freq"]]
+    every = f"every {series['interval_n']} {unit}s" if series["interval_n"] > 1 else f"every {unit}"
+    if series.get("occurrence_count"):
+        return f"{every}, {series['occurrence_count']} times"
+    if series.get("until_date"):
+        return f"{every} until {series['until_date'].strftime('%d-%m-%Y')}"
+    return every
+
+
+# =====================================================
+# DB
+# =====================================================
+def _fetch(cur, query, params):
+    if cur is None:
+        return db.fetch_all(query, params, coalesce=True)
+    cur.execute(query, params)
+    return cur.fetchall()
+
+
+def get_company_series(company, start_date, end_date, user_id=None, cur=None):
+    """
+    Series of the company that can have occurrences in [start_date, end_date),
+    each with its skipped dates in that window under "exceptions".
+    """
+    query = f"""
+        SELECT {SERIES_COLUMNS}, u.name AS booked_by, u.department AS user_department
+        FROM conference_users u
+        JOIN conference_booking_series s ON s.user_id=u.id
+        WHERE u.company=%s
+          AND s.start_date < %s
+          AND (s.last_date IS NULL OR s.last_date >= %s)
+    """
+    params = [company, end_date, start_date]
+    if user_id is not None:
+        query += " AND s.user_id=%s"
+        params.append(user_id)
+
+    series = _fetch(cur, query, tuple(params))
+    if not series:
+        return []
+
+    ids = [s["id"] for s in series]
+    marks = ", ".join(["%s"] * len(ids))
+    skipped = _fetch(cur, f"""
+        SELECT series_id, occurrence_date
+        FROM conference_booking_exceptions
+        WHERE series_id IN ({marks})
+          AND occurrence_date >= %s AND occurrence_date < %s
+    """, (*ids, start_date, end_date))
+
+    by_id = {s["id"]: s for s in series}
+    for s in series:
+        s["exceptions"] = set()
+    for row in skipped:
+        by_id[row["series_id"]]["exceptions"].add(row["occurrence_date"])
+    return series
+
+
+def expand(series_list, start_date, end_date):
+    """Generator of occurrence rows for [start_date, end_date)."""
+    for s in series_list:
+        for d in occurrence_dates(s, start_date, end_date, s["exceptions"]):
+            yield occurrence_row(s, d)
+
+
+def company_occurrences(company, start_date, end_date, user_id=None, cur=None):
+    return expand(get_company_series(company, start_date, end_date, user_id, cur), start_date, end_date)
+
+
+def skip_occurrence(series_id, uid, d):
+    db.execute("""
+        INSERT IGNORE INTO conference_booking_exceptions (series_id, occurrence_date)
+        SELECT id, %s FROM conference_booking_series WHERE id=%s AND user_id=%s
+    """, (d, series_id, uid))
+
+
+def end_series(series_id, uid, today=None):
+    """
+    Cancel the series from today on. Occurrences that already happened stay
+    in history: the series is cut off at yesterday, and only a series with
+    nothing in the past is deleted outright.
+    """
+    today = today or date.today()
+    with db.transaction(dictionary=True) as cur:
+        cur.execute(f"""
+            SELECT {SERIES_COLUMNS}
+            FROM conference_booking_series s
+            WHERE s.id=%s AND s.user_id=%s
+            FOR UPDATE
+        """, (series_id, uid))
+        series = cur.fetchone()
+        if series is None:
+            return
+
+        cur.execute("""
+            SELECT occurrence_date FROM conference_booking_exceptions
+            WHERE series_id=%s AND occurrence_date < %s
+        """, (series_id, today))
+        skipped = {r["occurrence_date"] for r in cur.fetchall()}
+        past = list(occurrence_dates(series, series["start_date"], today, skipped))
+
+        if not past:
+            cur.execute("DELETE FROM conference_booking_series WHERE id=%s", (series_id,))
+            cur.execute("DELETE FROM conference_booking_exceptions WHERE series_id=%s", (series_id,))
+            return
+
+        # The count no longer describes the series; the last date bounds it.
+        cur.execute("""
+            UPDATE conference_booking_series
+            SET until_date=%s, occurrence_count=NULL, last_date=%s
+            WHERE id=%s
+        """, (past[-1], past[-1], series_id))
@@ -0,0 +1,136 @@
+"""
+In-memory snapshots refreshed by updated_at watermarks.
+
+A snapshot holds the rows of one company-window (e.g. today's visitors of
+a company). The first read loads the window; later reads fetch only rows
+whose updated_at moved past the watermark and merge them in, so a steady
+refresh is one small indexed query. Snapshots live for the process and are
+shared by every session.
+
+The owner supplies fetch(since):
+  - since=None: every row of the window
+  - otherwise: every row of the company changed after `since`, with
+    in_window = 0 for rows that no longer belong (and for tombstones)
+Rows carry updated_at; the key field identifies them across fetches.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+import db
+
+
+# =====================================================
+# CONFIG
+# =====================================================
+# Re-read this far behind the watermark: a transaction can commit after a
+# later one whose updated_at we've already seen.
+SAFETY_LAG = timedelta(seconds=5)
+
+# Full reload now and then, as a backstop for writes that skip updated_at.
+RESYNC_INTERVAL = 600
+
+# A snapshot never asks for changes older than this: past it, it reloads.
+TOMBSTONE_TTL = RESYNC_INTERVAL + SAFETY_LAG.total_seconds()
+
+MAX_SNAPSHOTS = 512
+
+
+# =====================================================
+# SNAPSHOT
+# =====================================================
+def _db_now():
+    return db.fetch_one("SELECT NOW(3) AS now")["now"]
+
+
+class Snapshot:
+    def __init__(self, key_field, fetch):
+        self.key_field = key_field
+        self._fetch = fetch
+        self._rows = {}
+        self._watermark = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _merge(self, rows):
+        for r in rows:
+            key = r[self.key_field]
+            if r.pop("in_window", 1):
+                self._rows[key] = r
+            else:
+                self._rows.pop(key, None)
+
+    def _reload(self):
+        # The DB clock, not the newest row: an empty window still needs a
+        # watermark, or the next delta would read the company's history.
+        watermark = _db_now()
+        self._rows = {}
+        self._merge(self._fetch(None))
+        self._watermark = watermark
+        self._loaded_at = time.monotonic()
+
+    def _catch_up(self):
+        prune_tombstones()
+        changed = self._fetch(self._watermark - SAFETY_LAG)
+        if changed:
+            newest = max(r["updated_at"] for r in changed)
+            self._merge(changed)
+            self._watermark = max(self._watermark, newest)
+
+    def rows(self):
+        """Current rows of the window (refreshed first)."""
+        with self._lock:
+            if self._watermark is None or time.monotonic() - self._loaded_at > RESYNC_INTERVAL:
+                self._reload()
+            else:
+                self._catch_up()
+            return list(self._rows.values())
+
+
+# =====================================================
+# REGISTRY
+# =====================================================
+_snapshots = OrderedDict()
+_registry_lock = threading.Lock()
+
+
+def get_snapshot(key, key_field, fetch):
+    """
+    Process-wide snapshot for `key`, e.g. ("visitors", company_id, day).
+    `fetch` is only used when the snapshot is created.
+    """
+    with _registry_lock:
+        snap = _snapshots.get(key)
+        if snap is None:
+            snap = _snapshots[key] = Snapshot(key_field, fetch)
+            while len(_snapshots) > MAX_SNAPSHOTS:
+                _snapshots.popitem(last=False)
+        else:
+            _snapshots.move_to_end(key)
+        return snap
+
+
+_pruned_at = 0.0
+_prune_lock = threading.Lock()
+
+
+def prune_tombstones():
+    """Drop tombstones no snapshot can still need, at most once per resync interval."""
+    global _pruned_at
+    with _prune_lock:
+        if time.monotonic() - _pruned_at < RESYNC_INTERVAL:
+            return
+        _pruned_at = time.monotonic()
+    db.execute(
+        "DELETE FROM row_tombstones WHERE deleted_at < NOW(3) - INTERVAL %s SECOND",
+        (int(TOMBSTONE_TTL),)
+    )
+
+
+def record_deletion(cur, table, row_id, company):
+    """Tombstone for a hard delete, so snapshots can drop the row."""
+    cur.execute("""
+        INSERT INTO row_tombstones (table_name, row_id, company)
+        VALUES (%s, %s, %s)
+    """, (table, row_id, company))
@@ -1,22 +1,27 @@
+import os
+
 import streamlit as st
-import mysql.connector
-import boto3
-import json
-import smtplib
-from email.mime.text import MIMEText
-from datetime import datetime, date, time, timedelta
+from datetime import datetime, date, timedelta
 from streamlit_calendar import calendar
 
+import db
+import read_cache
+from credentials import get_credentials
+from booking_conflicts import (
+    BookingConflict, BookingError, IntervalIndex, insert_booking, insert_series, move_booking
+)
+from booking_recurrence import company_occurrences, describe, end_series, skip_occurrence
+from change_feed import record_deletion
+from mailer import send_email
+from room_allocator import book_any_room, rank_rooms
+from room_availability import (
+    ANY_ROOM, DEFAULT_ROOM, WORK_END, WORK_START, DayAvailability, get_company_rooms,
+)
+
 # ================= CONFIG =================
 LOGO_URL = "https://raw.githubusercontent.com/ZODOPT-Tech/Wheelbrand/main/images/zodopt.png"
 HEADER_GRADIENT = "linear-gradient(90deg,#50309D,#7A42FF)"
 
-AWS_REGION = "ap-south-1"
-AWS_SECRET_NAME = "arn:aws:secretsmanager:ap-south-1:034362058776:secret:Wheelbrand-zM6npS"
-
-WORK_START = time(9, 30)
-WORK_END = time(19, 0)
-
 DEPARTMENTS = [
     "Select", "Sales", "HR", "Finance",
     "Delivery/Tech", "Digital Marketing", "IT", "Tech"
@@ -27,83 +32,111 @@ PURPOSES = [
     "HOD Meeting", "Inductions", "Training"
 ]
 
+REPEATS = {"Does not repeat": None, "Daily": "daily", "Weekly": "weekly", "Monthly": "monthly"}
 
-# ================= SECRETS =================
-@st.cache_resource
-def get_credentials():
-    client = boto3.client("secretsmanager", region_name=AWS_REGION)
-    raw = client.get_secret_value(SecretId=AWS_SECRET_NAME)
-    return json.loads(raw["SecretString"])
-
-
-# ================= EMAIL =================
-def send_email(to_email, subject, body):
-    creds = get_credentials()
-
-    try:
-        msg = MIMEText(body, "plain")
-        msg["Subject"] = subject
-        msg["From"] = creds["SMTP_USER"]
-        msg["To"] = to_email
-
-        if int(creds["SMTP_PORT"]) == 465:
-            server = smtplib.SMTP_SSL(creds["SMTP_HOST"], int(creds["SMTP_PORT"]))
-        else:
-            server = smtplib.SMTP(creds["SMTP_HOST"], int(creds["SMTP_PORT"]))
-            server.starttls()
-
-        server.login(creds["SMTP_USER"], creds["SMTP_PASSWORD"])
-        server.sendmail(creds["SMTP_USER"], to_email, msg.as_string())
-        server.quit()
-
-        return True
-    except Exception as e:
-        st.error(f"Email send failed: {e}")
-        return False
+BOOKING_HORIZON = timedelta(days=90)   # how far ahead bookings can be made
+HISTORY_PAGE_SIZE = 20
 
 
 # ================= DB =================
-@st.cache_resource
-def get_conn():
-    c = get_credentials()
-    return mysql.connector.connect(
-        host=c["DB_HOST"],
-        user=c["DB_USER"],
-        password=c["DB_PASSWORD"],
-        database=c["DB_NAME"],
-        autocommit=True
-    )
+BOOKING_COLUMNS = "id, room_id, booking_date, start_time, end_time, department, purpose"
 
 
-def get_my_bookings(uid):
-    conn = get_conn()
-    cur = conn.cursor(dictionary=True)
-    cur.execute("""
-        SELECT *
+def get_my_bookings(uid, start_date, end_date):
+    """
+    User's bookings with booking_date in [start_date, end_date), including
+    occurrences of their recurring series in that window.
+    """
+    rows = db.fetch_all(f"""
+        SELECT {BOOKING_COLUMNS}
         FROM conference_bookings
         WHERE user_id=%s
-        ORDER BY booking_date DESC, start_time ASC
-    """, (uid,))
-    return cur.fetchall()
-
-
-def save_booking(uid, d, s, e, dept, purpose):
-    conn = get_conn()
-    cur = conn.cursor()
-
-    # Insert booking
-    cur.execute("""
-        INSERT INTO conference_bookings
-            (user_id, booking_date, start_time, end_time, department, purpose)
-        VALUES (%s, %s, %s, %s, %s, %s)
-    """, (uid, d, s, e, dept, purpose))
+          AND booking_date >= %s
+          AND booking_date < %s
+        ORDER BY booking_date ASC, start_time ASC
+    """, (uid, start_date, end_date))
+    rows += company_occurrences(get_user_company(uid), start_date, end_date, user_id=uid)
+    rows.sort(key=lambda b: b["start_time"])
+    return rows
+
+
+def get_my_booking_history(uid, limit=50, before=None):
+    """
+    Newest-first page of the user's bookings. Pass the last row of the
+    previous page as `before` to get the next one (keyset pagination).
+    """
+    if before is None:
+        return db.fetch_all(f"""
+            SELECT {BOOKING_COLUMNS}
+            FROM conference_bookings
+            WHERE user_id=%s
+            ORDER BY booking_date DESC, start_time DESC, id DESC
+            LIMIT %s
+        """, (uid, limit))
+
+    return db.fetch_all(f"""
+        SELECT {BOOKING_COLUMNS}
+        FROM conference_bookings
+        WHERE user_id=%s
+          AND (booking_date, start_time, id) < (%s, %s, %s)
+        ORDER BY booking_date DESC, start_time DESC, id DESC
+        LIMIT %s
+    """, (uid, before["booking_date"], before["start_time"], before["id"], limit))
+
+
+def get_user_company(uid):
+    if st.session_state.get("user_company") is None:
+        row = db.fetch_one("SELECT company FROM conference_users WHERE id=%s", (uid,))
+        st.session_state["user_company"] = row["company"] if row else None
+    return st.session_state["user_company"]
+
+
+def get_company_window(company, start_date, end_date):
+    """
+    Every booking of the company with booking_date in [start_date, end_date),
+    all rooms, including series occurrences. Range scan on
+    ix_conf_users_company -> ix_bookings_user_date.
+    """
+    rows = db.fetch_all("""
+        SELECT b.id, b.room_id, b.start_time, b.end_time, b.purpose, u.name AS booked_by
+        FROM conference_users u
+        JOIN conference_bookings b ON b.user_id=u.id
+        WHERE u.company=%s
+          AND b.booking_date >= %s
+          AND b.booking_date < %s
+    """, (company, start_date, end_date))
+    rows += company_occurrences(company, start_date, end_date)
+    return rows
+
+
+def get_day_bookings(company, d):
+    """Every booking of the company on day d, all rooms (for availability)."""
+    return get_company_window(company, d, d + timedelta(days=1))
+
+
+def save_booking(uid, d, s, e, dept, purpose, room=None, attendees=None, avail=None):
+    """
+    Raises BookingError / BookingConflict if the slot can't be booked.
+    room=ANY_ROOM lets the allocator pick from `avail`.
+    """
+    room = room or DEFAULT_ROOM
 
     # Fetch user info
-    cur.execute("SELECT name, email FROM conference_users WHERE id=%s", (uid,))
-    u = cur.fetchone()
+    u = db.fetch_one("SELECT name, email, company FROM conference_users WHERE id=%s", (uid,))
+    if not u:
+        raise BookingError("User not found. Login again.")
+
+    # Insert booking (overlap re-checked under a day lock)
+    if room is ANY_ROOM:
+        booking_id, room = book_any_room(uid, u["company"], avail, d, s, e, dept, purpose, attendees)
+    else:
+        booking_id = insert_booking(
+            uid, u["company"], d, s, e, dept, purpose, room["id"], attendees=attendees
+        )
+    bookings_changed(u["company"])
 
-    if u:
-        uname, email = u
+    if u["email"]:
+        uname, email = u["name"], u["email"]
 
         subject = "Conference Room Booking Confirmation"
         body = f"""
@@ -113,6 +146,7 @@ Your conference room booking is confirmed.
 
 📅 Date: {d.strftime('%d-%m-%Y')}
 ⏰ Time: {s.strftime('%I:%M %p')} - {e.strftime('%I:%M %p')}
+🚪 Room: {room['name']}
 🏢 Department: {dept}
 📝 Purpose: {purpose}
 
@@ -120,65 +154,246 @@ Thank you,
 ZODOPT MeetEase Team
 """
 
-        send_email(email, subject, body)
+        send_email(email, subject, body, idempotency_key=f"booking:{booking_id}")
+
+
+def save_series(uid, d, s, e, dept, purpose, room, freq, until=None, count=None):
+    """
+    Store a recurring booking starting on d. Raises BookingError /
+    BookingConflict if any occurrence clashes. `room` may be a list of
+    candidates, tried in order: the first that is free for the whole series wins.
+    """
+    u = db.fetch_one("SELECT name, email, company FROM conference_users WHERE id=%s", (uid,))
+    if not u:
+        raise BookingError("User not found. Login again.")
+
+    candidates = room if isinstance(room, list) else [room or DEFAULT_ROOM]
+    series = {
+        "freq": freq, "interval_n": 1, "start_date": d,
+        "until_date": until, "occurrence_count": count,
+        "start_at": s.time(), "end_at": e.time(),
+    }
+
+    for i, r in enumerate(candidates):
+        try:
+            series_id = insert_series(uid, u["company"], dict(series, room_id=r["id"]), dept, purpose)
+            room = r
+            break
+        except BookingConflict:
+            if i == len(candidates) - 1:
+                raise
+    bookings_changed(u["company"])
+
+    if u["email"]:
+        body = f"""
+Hello {u['name']},
+
+Your recurring conference room booking is confirmed.
+
+📅 Starts: {d.strftime('%d-%m-%Y')}, repeats {describe(series)}
+⏰ Time: {s.strftime('%I:%M %p')} - {e.strftime('%I:%M %p')}
+🚪 Room: {room['name']}
+🏢 Department: {dept}
+📝 Purpose: {purpose}
+
+Thank you,
+ZODOPT MeetEase Team
+"""
+        send_email(
+            u["email"], "Recurring Conference Booking Confirmation", body,
+            idempotency_key=f"series:{series_id}",
+        )
 
 
 def delete_booking(bid, uid):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        DELETE FROM conference_bookings
-        WHERE id=%s AND user_id=%s
-    """, (bid, uid))
+    company = get_user_company(uid)
+    with db.transaction() as cur:
+        cur.execute("""
+            DELETE FROM conference_bookings
+            WHERE id=%s AND user_id=%s
+        """, (bid, uid))
+        if cur.rowcount:
+            record_deletion(cur, "conference_bookings", bid, company)
+    bookings_changed(company)
 
 
-def update_booking_time(bid, uid, s, e):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        UPDATE conference_bookings 
-        SET start_time=%s, end_time=%s
-        WHERE id=%s AND user_id=%s
-    """, (s, e, bid, uid))
+def update_booking_time(bid, uid, s, e, room_id=None):
+    """Raises BookingError / BookingConflict if the new slot can't be used."""
+    move_booking(bid, uid, get_user_company(uid), s.date(), s, e, room_id)
+    bookings_changed(get_user_company(uid))
 
 
-# ================= TIME SLOTS =================
-def generate_slots(selected_date: date):
-    now = datetime.now()
-    slots = ["Select"]
+def skip_series_date(series_id, uid, d):
+    skip_occurrence(series_id, uid, d)
+    bookings_changed(get_user_company(uid))
 
-    start_dt = datetime.combine(selected_date, WORK_START)
-    end_dt = datetime.combine(selected_date, WORK_END)
 
-    cur = start_dt
-    while cur <= end_dt:
-        label = cur.strftime("%I:%M %p")
+def cancel_series(series_id, uid):
+    end_series(series_id, uid)
+    bookings_changed(get_user_company(uid))
+
+
+# ================= TIME SLOTS =================
+FIND_DURATIONS = {"30 min": 30, "1 hour": 60, "1.5 hours": 90, "2 hours": 120}
+ANY_ROOM_LABEL = "Any suitable room"
 
-        if selected_date == date.today():
-            if cur > now:
-                slots.append(label)
-        else:
-            slots.append(label)
 
-        cur += timedelta(minutes=30)
+def slot_label(t):
+    return t.strftime("%I:%M %p")
 
-    return slots
+
+def day_availability(rooms, day_rows, d, ignore_id=None):
+    return DayAvailability(
+        d, rooms, day_rows, WORK_START, WORK_END,
+        now=datetime.now(), ignore_id=ignore_id,
+    )
 
 
 # ================= EVENTS =================
-def prepare_events(rows):
+# view -> (with a FullCalendar Scheduler licence, without one). The room
+# lane (resource) views are commercial; the free views show the room in the
+# event title and colour instead.
+CALENDAR_VIEWS = {
+    "My Day": ("timeGridDay", "timeGridDay"),
+    "Company Week": ("resourceTimelineWeek", "timeGridWeek"),
+    "Company Month": ("resourceTimelineMonth", "dayGridMonth"),
+}
+EVENT_CACHE_TTL = 300
+
+EVENT_COLOR = "#50309D"
+ROOM_COLORS = ["#50309D", "#1F7A8C", "#C0392B", "#D68910", "#1E8449", "#7D3C98", "#2E4053"]
+
+
+def scheduler_license_key():
+    """
+    Purchased FullCalendar Scheduler key, from the environment or the app
+    secret (FULLCALENDAR_LICENSE_KEY). None means the free views are used.
+    """
+    key = os.environ.get("FULLCALENDAR_LICENSE_KEY")
+    if key is None:
+        try:
+            key = get_credentials().get("FULLCALENDAR_LICENSE_KEY")
+        except Exception:
+            key = None
+    return key or None
+
+
+def room_lane(room_id):
+    return "default" if room_id is None else str(room_id)
+
+
+def prepare_events(rows, rooms=(), room_titles=False):
+    """
+    Calendar events, coloured per room. room_titles prefixes the room name,
+    for views without room lanes.
+    """
+    # Fixed order and ids: FullCalendar diffs the events prop by id, so a
+    # stable list means only changed events are touched on the client.
+    rows = sorted(rows, key=lambda b: (b["start_time"], str(b["id"])))
+    names = {r["id"]: r["name"] for r in rooms}
+    colors = {r["id"]: ROOM_COLORS[i % len(ROOM_COLORS)] for i, r in enumerate(rooms)}
     return [
         {
             "id": str(b["id"]),
-            "title": b["purpose"],
+            "resourceId": room_lane(b.get("room_id")),
+            "title": (f"{names[b.get('room_id')]} · " if room_titles and b.get("room_id") in names else "")
+                     + ("↻ " if b.get("series_id") else "") + b["purpose"]
+                     + (f" · {b['booked_by']}" if b.get("booked_by") else ""),
             "start": b["start_time"].isoformat(),
             "end": b["end_time"].isoformat(),
-            "color": "#50309D",
+            "color": colors.get(b.get("room_id"), EVENT_COLOR),
         }
         for b in rows
     ]
 
 
+@st.cache_resource
+def _calendar_generations():
+    """Process-wide company -> counter, bumped by every booking write."""
+    return {}
+
+
+def bookings_changed(company):
+    """Called by every booking write: drop cached calendar and dashboard reads."""
+    gens = _calendar_generations()
+    gens[company] = gens.get(company, 0) + 1
+    read_cache.invalidate("conference", company)
+
+
+@st.cache_data(ttl=EVENT_CACHE_TTL, max_entries=256, show_spinner=False)
+def _window_events(company, start_date, end_date, generation, rooms, room_titles):
+    # generation is only part of the cache key: a write makes new entries.
+    rooms = [{"id": rid, "name": name} for rid, name in rooms]
+    return prepare_events(get_company_window(company, start_date, end_date), rooms, room_titles)
+
+
+def company_window_events(company, start_date, end_date, rooms, room_titles=False):
+    """Cached events per (company, window); TTL covers out-of-app writes."""
+    gen = _calendar_generations().get(company, 0)
+    room_key = tuple((r["id"], r["name"]) for r in rooms)
+    return _window_events(company, start_date, end_date, gen, room_key, room_titles)
+
+
+def view_window(view, anchor):
+    """Visible [start, end) dates of a calendar view around `anchor`."""
+    if view == "Company Week":
+        start = anchor - timedelta(days=anchor.weekday())
+        return start, start + timedelta(days=7)
+    if view == "Company Month":
+        start = anchor.replace(day=1)
+        return start, (start + timedelta(days=32)).replace(day=1)
+    return anchor, anchor + timedelta(days=1)
+
+
+def _shift_anchor(view, step):
+    anchor = st.session_state["cal_date"]
+    if view == "Company Month":
+        first = anchor.replace(day=1)
+        anchor = (first + timedelta(days=32)).replace(day=1) if step > 0 \
+            else (first - timedelta(days=1)).replace(day=1)
+    else:
+        anchor += timedelta(days=7 if view == "Company Week" else 1) * step
+
+    today = date.today()
+    st.session_state["cal_date"] = min(max(anchor, today), today + BOOKING_HORIZON)
+
+
+def render_calendar(view, anchor, rooms, events):
+    """
+    Mount the calendar under a key that only changes with the view/window,
+    so FullCalendar isn't re-initialized on every rerun; with the stable
+    event ids and order from prepare_events it only redraws what changed.
+    """
+    key = f"cal-{view}-{view_window(view, anchor)[0].isoformat()}"
+    calendar(events=events, options=calendar_options(view, anchor, rooms), key=key)
+
+
+def calendar_options(view, anchor, rooms):
+    license_key = scheduler_license_key()
+    licensed_view, free_view = CALENDAR_VIEWS[view]
+    options = {
+        "initialView": licensed_view if license_key else free_view,
+        "initialDate": anchor.isoformat(),
+        "headerToolbar": {"left": "", "center": "title", "right": ""},
+        "slotMinTime": "09:30:00",
+        "slotMaxTime": "19:00:00",
+        "slotDuration": "00:30:00",
+        "height": 700,
+    }
+    if view != "My Day" and license_key:
+        options.update({
+            "schedulerLicenseKey": license_key,
+            "resources": [{"id": room_lane(r["id"]), "title": r["name"]} for r in rooms],
+            "resourceAreaHeaderContent": "Rooms",
+            "resourceAreaWidth": "18%",
+        })
+        if view == "Company Week":
+            options["slotDuration"] = "01:00:00"
+        else:
+            options["slotDuration"] = {"days": 1}
+    return options
+
+
 # ================= CSS =================
 def css():
     st.markdown(f"""
@@ -223,6 +438,38 @@ def css():
     """, unsafe_allow_html=True)
 
 
+# ================= BOOKING HISTORY =================
+def render_booking_history(uid, room_by_id, show_room):
+    """One page of the user's bookings, newest first, with Newer / Older."""
+    # Keyset pagination: the stack holds the `before` row of every page seen
+    cursors = st.session_state.setdefault("history_cursors", [None])
+    rows = get_my_booking_history(uid, HISTORY_PAGE_SIZE + 1, cursors[-1])
+    more = len(rows) > HISTORY_PAGE_SIZE
+    rows = rows[:HISTORY_PAGE_SIZE]
+
+    if not rows:
+        st.info("No bookings yet")
+    for b in rows:
+        b_room = room_by_id.get(b["room_id"], DEFAULT_ROOM)
+        st.write(
+            f"**{b['booking_date'].strftime('%d %b %Y')}**  "
+            f"{b['start_time'].strftime('%I:%M %p')} - {b['end_time'].strftime('%I:%M %p')}  "
+            f"{b['purpose']} | {b['department']}"
+            + (f" | {b_room['name']}" if show_room else "")
+        )
+
+    c1, c2 = st.columns(2)
+    with c1:
+        if len(cursors) > 1 and st.button("Newer", key="history_newer"):
+            cursors.pop()
+            st.rerun()
+    with c2:
+        if more and st.button("Older", key="history_older"):
+            last = rows[-1]
+            cursors.append({k: last[k] for k in ("booking_date", "start_time", "id")})
+            st.rerun()
+
+
 # ================= MAIN PAGE =================
 def render_booking_page():
     css()
@@ -231,6 +478,7 @@ def render_booking_page():
         st.session_state.edit_id = None
 
     uid = st.session_state.get("user_id")
+    company = get_user_company(uid)
 
     # -------- HEADER --------
     st.markdown(f"""
@@ -242,27 +490,39 @@ def render_booking_page():
 
     col_left, col_right = st.columns([2, 1])
 
+    rooms = get_company_rooms(company, on_adopt=bookings_changed)
+    room_by_id = {r["id"]: r for r in rooms}
+
     # ================= LEFT - CALENDAR =================
     with col_left:
-        rows = get_my_bookings(uid)
-
-        today_rows = [
-            b for b in rows
-            if b["booking_date"] == date.today()
-        ]
-
-        events = prepare_events(today_rows)
-
-        calendar(
-            events=events,
-            options={
-                "initialView": "timeGridDay",
-                "slotMinTime": "09:30:00",
-                "slotMaxTime": "19:00:00",
-                "slotDuration": "00:30:00",
-                "height": 700,
-            }
-        )
+        today = date.today()
+        if st.session_state.get("cal_date") is None or st.session_state["cal_date"] < today:
+            st.session_state["cal_date"] = today
+
+        v1, v2, v3, v4 = st.columns([3, 3, 1, 1])
+        with v1:
+            view = st.radio("View", list(CALENDAR_VIEWS), horizontal=True, label_visibility="collapsed")
+        with v2:
+            sel_d = st.date_input(
+                "Date", key="cal_date", min_value=today, max_value=today + BOOKING_HORIZON,
+                label_visibility="collapsed",
+            )
+        with v3:
+            st.button("◀", on_click=_shift_anchor, args=(view, -1), use_container_width=True)
+        with v4:
+            st.button("▶", on_click=_shift_anchor, args=(view, 1), use_container_width=True)
+
+        my_rows = get_my_bookings(uid, sel_d, sel_d + timedelta(days=1))
+
+        # Only the visible window is fetched; company views are cached per window.
+        if view == "My Day":
+            render_calendar(view, sel_d, rooms, prepare_events(my_rows, rooms, len(rooms) > 1))
+        else:
+            events = company_window_events(
+                company, *view_window(view, sel_d), rooms,
+                room_titles=len(rooms) > 1 and not scheduler_license_key(),
+            )
+            render_calendar(view, sel_d, rooms, events)
 
         if st.button("Back to Dashboard", use_container_width=True):
             st.session_state["current_page"] = "conference_dashboard"
@@ -271,45 +531,117 @@ def render_booking_page():
     # ================= RIGHT SIDE =================
     with col_right:
 
-        # -------- BOOKING FORM --------
-        st.subheader("Book a Slot")
+        # -------- AVAILABILITY --------
+        day_rows = get_day_bookings(company, sel_d)
+        avail = day_availability(rooms, day_rows, sel_d)
 
-        sel_d = date.today()   # only today allowed
-        opts = generate_slots(sel_d)
+        # -------- BOOKING FORM --------
+        st.subheader(f"Book a Slot — {sel_d.strftime('%d %b %Y')}")
+
+        room = rooms[0]
+        room_key = room["id"]
+        if len(rooms) > 1:
+            names = [ANY_ROOM_LABEL] + [r["name"] for r in rooms]
+            pick = names.index(st.selectbox("Room", names))
+            room = ANY_ROOM if pick == 0 else rooms[pick - 1]
+            room_key = ANY_ROOM if pick == 0 else room["id"]
+
+        # Start/end only offer times that are free in the chosen room (in
+        # some room, for "any"). Start sits outside the form so the end
+        # options follow it.
+        starts = avail.free_starts(room_key)
+        start_opts = ["Select"] + [slot_label(t) for t in starts]
+        s = st.selectbox("Start Time", start_opts)
+        sdt = starts[start_opts.index(s) - 1] if s != "Select" else None
+
+        ends = avail.free_ends(room_key, sdt) if sdt else []
+        end_opts = ["Select"] + [slot_label(t) for t in ends]
+
+        if not starts:
+            st.info("No free slots left on this day in this room.")
 
         with st.form("book"):
-            s = st.selectbox("Start Time", opts)
-            e = st.selectbox("End Time", opts)
+            e = st.selectbox("End Time", end_opts)
             dept = st.selectbox("Department", DEPARTMENTS)
             pp = st.selectbox("Purpose", PURPOSES)
+            attendees = None
+            if len(rooms) > 1:
+                attendees = st.number_input("Attendees", min_value=0, step=1, value=0) or None
+
+            repeat = REPEATS[st.selectbox("Repeat", list(REPEATS))]
+            r1, r2 = st.columns(2)
+            with r1:
+                until = st.date_input("Repeat until", value=sel_d + timedelta(days=90), min_value=sel_d)
+            with r2:
+                count = st.number_input("or occurrences", min_value=0, step=1, value=0) or None
 
             if st.form_submit_button("Confirm Booking"):
                 if s=="Select" or e=="Select" or dept=="Select" or pp=="Select":
                     st.error("All fields required")
                 else:
-                    sd = sel_d
-                    sdt = datetime.combine(sd, datetime.strptime(s,"%I:%M %p").time())
-                    edt = datetime.combine(sd, datetime.strptime(e,"%I:%M %p").time())
-                    save_booking(uid, sd, sdt, edt, dept, pp)
-                    st.success("Booking Successful — Email Sent!")
-                    st.rerun()
-
-        # -------- TODAY'S BOOKINGS --------
-        with st.expander("Today's Bookings", expanded=True):
-
-            if not today_rows:
-                st.info("No bookings today")
+                    edt = ends[end_opts.index(e) - 1]
+                    try:
+                        if repeat is None:
+                            save_booking(uid, sel_d, sdt, edt, dept, pp, room, attendees, avail)
+                        elif room is ANY_ROOM:
+                            # Try rooms that fit the first occurrence, best first.
+                            save_series(
+                                uid, sel_d, sdt, edt, dept, pp,
+                                rank_rooms(avail, sdt, edt, attendees) or [rooms[0]],
+                                repeat, None if count else until, count,
+                            )
+                        else:
+                            save_series(uid, sel_d, sdt, edt, dept, pp, room, repeat, None if count else until, count)
+                    except BookingError as err:
+                        st.error(str(err))
+                    else:
+                        st.success("Booking Successful — Email Sent!")
+                        st.rerun()
+
+        # -------- FREE SLOT FINDER --------
+        with st.expander("Find a Free Slot"):
+            dur = st.selectbox("Duration", list(FIND_DURATIONS))
+            windows = avail.first_free_windows(timedelta(minutes=FIND_DURATIONS[dur]), limit=5)
+
+            if not windows:
+                st.info("No free window of that length on this day.")
+            for w in windows:
+                st.write(f"**{w['room']['name']}**  {slot_label(w['start'])} - {slot_label(w['end'])}")
+
+        # -------- MY BOOKINGS ON THE DAY --------
+        with st.expander("My Bookings", expanded=True):
+
+            if not my_rows:
+                st.info("No bookings on this day")
             else:
-                for b in today_rows:
+                for b in my_rows:
                     st.markdown("<div class='booking-item'>", unsafe_allow_html=True)
 
+                    b_room = room_by_id.get(b["room_id"], DEFAULT_ROOM)
                     st.write(
                         f"**{b['booking_date'].strftime('%d %b %Y')}**  "
                         f"{b['start_time'].strftime('%I:%M %p')} - {b['end_time'].strftime('%I:%M %p')}  "
                         f"{b['purpose']} | {b['department']}"
+                        + (f" | {b_room['name']}" if len(rooms) > 1 else "")
+                        + (" | ↻ Recurring" if b.get("series_id") else "")
                     )
 
                     c1, c2 = st.columns(2)
+                    if b.get("series_id"):
+                        # Occurrences aren't rows: skip one date, or end the series here.
+                        with c1:
+                            if st.button("Skip", key=f"k{b['id']}"):
+                                skip_series_date(b['series_id'], uid, b['booking_date'])
+                                st.success("Occurrence skipped")
+                                st.rerun()
+                        with c2:
+                            if st.button("Cancel Series", key=f"c{b['id']}"):
+                                cancel_series(b['series_id'], uid)
+                                st.success("Series canceled")
+                                st.rerun()
+                        st.markdown("</div>", unsafe_allow_html=True)
+                        continue
+
                     with c1:
                         if st.button("Edit", key=f"e{b['id']}"):
                             st.session_state.edit_id = b['id']
@@ -326,23 +658,41 @@ def render_booking_page():
                         st.write("---")
                         with st.form(f"edit_form_{b['id']}"):
                             sd = b['booking_date']
-                            slots = generate_slots(sd)
 
-                            s_str = b['start_time'].strftime("%I:%M %p")
-                            e_str = b['end_time'].strftime("%I:%M %p")
+                            # Free times in this booking's room, not counting itself
+                            edit_avail = day_availability(rooms, day_rows, sd, ignore_id=b['id'])
+                            free = edit_avail.free_starts(b['room_id']) if b['room_id'] in room_by_id else []
+                            s_times = [b['start_time']] + [t for t in free if t != b['start_time']]
+                            e_times = [b['end_time']] + [t + edit_avail.slot for t in free if t + edit_avail.slot != b['end_time']]
+                            s_times.sort()
+                            e_times.sort()
 
-                            s_idx = slots.index(s_str) if s_str in slots else 0
-                            e_idx = slots.index(e_str) if e_str in slots else 0
+                            s_labels = [slot_label(t) for t in s_times]
+                            e_labels = [slot_label(t) for t in e_times]
 
-                            ns = st.selectbox("Start", slots, index=s_idx)
-                            ne = st.selectbox("End", slots, index=e_idx)
+                            ns = st.selectbox("Start", s_labels, index=s_times.index(b['start_time']))
+                            ne = st.selectbox("End", e_labels, index=e_times.index(b['end_time']))
 
                             if st.form_submit_button("Save"):
-                                ns_t = datetime.combine(sd, datetime.strptime(ns,"%I:%M %p").time())
-                                ne_t = datetime.combine(sd, datetime.strptime(ne,"%I:%M %p").time())
-                                update_booking_time(b['id'], uid, ns_t, ne_t)
-                                st.success("Updated")
-                                st.session_state.edit_id = None
-                                st.rerun()
+                                ns_t = s_times[s_labels.index(ns)]
+                                ne_t = e_times[e_labels.index(ne)]
+                                try:
+                                    clash = IntervalIndex(
+                                        r for r in day_rows if r['room_id'] == b['room_id']
+                                    ).find_overlap(ns_t, ne_t, ignore_id=b['id'])
+                                    if clash:
+                                        raise BookingConflict(clash)
+                                    update_booking_time(b['id'], uid, ns_t, ne_t, b['room_id'])
+                                except BookingError as err:
+                                    st.error(str(err))
+                                else:
+                                    st.success("Updated")
+                                    st.session_state.edit_id = None
+                                    st.rerun()
 
                     st.markdown("</div>", unsafe_allow_html=True)
+
+        # -------- BOOKING HISTORY --------
+        # A toggle, not an expander: collapsed expanders still run their query
+        if st.toggle("Booking History", key="show_history"):
+            render_booking_history(uid, room_by_id, len(rooms) > 1)
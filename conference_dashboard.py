@@ -1,73 +1,123 @@
 
 import streamlit as st
-import boto3
-import json
-import mysql.connector
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
+
+import db
+import read_cache
+from booking_recurrence import company_occurrences
+from change_feed import get_snapshot
+from room_availability import DEFAULT_ROOM
 
 
 # ===================================
 # CONFIG
 # ===================================
-AWS_REGION = "ap-south-1"
-AWS_SECRET = "arn:aws:secretsmanager:ap-south-1:034362058776:secret:Wheelbrand-zM6npS"
-
 LOGO_URL = "https://raw.githubusercontent.com/ZODOPT-Tech/Wheelbrand/main/images/zodopt.png"
 GRADIENT = "linear-gradient(90deg, #50309D, #7A42FF)"
 
 
 # ===================================
-# DB + SECRETS
+# DB
 # ===================================
-@st.cache_resource
-def get_credentials():
-    client = boto3.client("secretsmanager", region_name=AWS_REGION)
-    result = client.get_secret_value(SecretId=AWS_SECRET)
-    return json.loads(result["SecretString"])
-
-
-@st.cache_resource
-def get_conn():
-    """Persistent DB connection"""
-    c = get_credentials()
-    return mysql.connector.connect(
-        host=c["DB_HOST"],
-        user=c["DB_USER"],
-        password=c["DB_PASSWORD"],
-        database=c["DB_NAME"],
-        autocommit=True
+@read_cache.cached("conference_user", ttl=60)
+def get_company_user(user_id: int):
+    return db.fetch_one(
+        "SELECT name, company FROM conference_users WHERE id=%s LIMIT 1",
+        (user_id,), coalesce=True
     )
 
 
-def get_company_user(user_id: int):
-    """No caching → reflects live changes"""
-    conn = get_conn()
-    cur = conn.cursor(dictionary=True)
-    cur.execute(
-        "SELECT name, company FROM conference_users WHERE id=%s LIMIT 1",
-        (user_id,)
+def _room_names(company):
+    rows = db.fetch_all(
+        "SELECT id, name FROM conference_rooms WHERE company=%s", (company,), coalesce=True
     )
-    return cur.fetchone()
-
-
-def get_company_bookings(company: str):
-    """No caching → reflects live bookings"""
-    conn = get_conn()
-    cur = conn.cursor(dictionary=True)
-    cur.execute("""
-        SELECT b.id,
-               u.name AS booked_by,
-               u.department,
-               b.start_time,
-               b.end_time,
-               b.purpose
-        FROM conference_bookings b
-        JOIN conference_users u ON u.id=b.user_id
+    return {r["id"]: r["name"] for r in rows}
+
+
+def _bookings_feed(company, start_date, end_date):
+    def fetch(since):
+        if since is None:
+            return db.fetch_all("""
+                SELECT b.id, u.name AS booked_by, u.department, b.room_id,
+                       b.start_time, b.end_time, b.purpose, b.updated_at
+                FROM conference_users u
+                JOIN conference_bookings b ON b.user_id=u.id
+                WHERE u.company=%s
+                  AND b.booking_date >= %s
+                  AND b.booking_date < %s
+            """, (company, start_date, end_date), coalesce=True)
+
+        # Changed rows (in or out of the window) plus deletions, one query
+        return db.fetch_all("""
+            SELECT b.id, u.name AS booked_by, u.department, b.room_id,
+                   b.start_time, b.end_time, b.purpose, b.updated_at,
+                   (b.booking_date >= %s AND b.booking_date < %s) AS in_window
+            FROM conference_bookings b
+            JOIN conference_users u ON u.id=b.user_id
+            WHERE b.updated_at > %s AND u.company=%s
+            UNION ALL
+            SELECT row_id, NULL, NULL, NULL, NULL, NULL, NULL, deleted_at, 0
+            FROM row_tombstones
+            WHERE table_name='conference_bookings' AND company=%s AND deleted_at > %s
+        """, (start_date, end_date, since, company, company, since), coalesce=True)
+    return fetch
+
+
+@read_cache.cached("conference")
+def get_company_bookings(company: str, start_date, end_date):
+    """
+    Table rows for bookings with booking_date in [start_date, end_date),
+    including recurring-series occurrences. Bookings come from a shared
+    in-memory snapshot refreshed by updated_at deltas.
+    """
+    snap = get_snapshot(
+        ("conference_bookings", company, start_date, end_date), "id",
+        _bookings_feed(company, start_date, end_date),
+    )
+    rows = snap.rows()
+    rows += (
+        {
+            "booked_by": occ["booked_by"], "department": occ["user_department"],
+            "room_id": occ["room_id"], "start_time": occ["start_time"],
+            "end_time": occ["end_time"], "purpose": occ["purpose"],
+        }
+        for occ in company_occurrences(company, start_date, end_date)
+    )
+    rows.sort(key=lambda b: b["start_time"], reverse=True)
+    return rows
+
+
+@read_cache.cached("conference")
+def get_booking_summary(company: str, day):
+    """
+    Summary cards for one day: total, per department, per purpose and per
+    room. One grouped query; the per-dimension totals are folded from its
+    handful of (department, purpose, room) groups. Series occurrences are
+    not rows, so they're added on top.
+    """
+    groups = db.fetch_all("""
+        SELECT u.department, b.purpose, b.room_id, COUNT(*) AS n
+        FROM conference_users u
+        JOIN conference_bookings b ON b.user_id=u.id
         WHERE u.company=%s
-        ORDER BY b.start_time DESC;
-    """, (company,))
-    return cur.fetchall()
+          AND b.booking_date >= %s
+          AND b.booking_date < %s
+        GROUP BY u.department, b.purpose, b.room_id
+    """, (company, day, day + timedelta(days=1)), coalesce=True)
+    groups += (
+        {"department": o["user_department"], "purpose": o["purpose"], "room_id": o["room_id"], "n": 1}
+        for o in company_occurrences(company, day, day + timedelta(days=1))
+    )
+
+    rooms = _room_names(company)
+    summary = {"total": 0, "department": {}, "purpose": {}, "room": {}}
+    for g in groups:
+        summary["total"] += g["n"]
+        room = rooms.get(g["room_id"], DEFAULT_ROOM["name"])
+        for dim, label in (("department", g["department"]), ("purpose", g["purpose"]), ("room", room)):
+            summary[dim][label] = summary[dim].get(label, 0) + g["n"]
+    return summary, rooms
 
 
 # ===================================
@@ -143,28 +193,21 @@ def render_dashboard():
         st.error("Unauthorized. Login again.")
         st.stop()
 
-    # USER INFO
-    user = get_company_user(user_id)
-    company = user["company"]
-
     # -----------------------------------
-    # LIVE BOOKINGS → ONLY TODAY
+    # USER INFO + LIVE BOOKINGS → ONLY TODAY
     # -----------------------------------
-    all_bookings = get_company_bookings(company)
+    # The company is normally known from login, so the user lookup only runs
+    # (first) when it isn't; the two booking queries then run concurrently.
     today = datetime.today().date()
-
-    todays_bookings = [
-        b for b in all_bookings
-        if b["start_time"].date() == today
-    ]
-
-    # -----------------------------------
-    # DEPARTMENT COUNT
-    # -----------------------------------
-    dept_count = {}
-    for b in todays_bookings:
-        dept = b["department"]
-        dept_count[dept] = dept_count.get(dept, 0) + 1
+    company = st.session_state.get("user_company")
+    if company is None:
+        company = get_company_user(user_id)["company"]
+        st.session_state["user_company"] = company
+
+    (summary, room_names), todays_bookings = db.fetch_parallel(
+        lambda: get_booking_summary(company, today),
+        lambda: get_company_bookings(company, today, today + timedelta(days=1)),
+    )
 
     # -----------------------------------
     # HEADER
@@ -213,22 +256,25 @@ def render_dashboard():
             f"""
             <div class="summary-card">
                 <div class="summary-title">Today's Bookings</div>
-                <div class="summary-value">{len(todays_bookings)}</div>
+                <div class="summary-value">{summary["total"]}</div>
             </div>
             """,
             unsafe_allow_html=True,
         )
 
-        st.subheader("By Department")
+        # Rooms are only worth a breakdown once the company has several.
+        second = ("room", "By Room") if len(room_names) > 1 else ("purpose", "By Purpose")
+        for dim, title in (("department", "By Department"), second):
+            st.subheader(title)
 
-        if not dept_count:
-            st.info("No bookings today.")
-        else:
-            for dept, count in dept_count.items():
+            if not summary[dim]:
+                st.info("No bookings today.")
+                continue
+            for label, count in sorted(summary[dim].items(), key=lambda kv: -kv[1]):
                 st.markdown(
                     f"""
                     <div class="summary-card">
-                        <div class="summary-title">{dept}</div>
+                        <div class="summary-title">{label}</div>
                         <div class="summary-value">{count}</div>
                     </div>
                     """,
@@ -243,14 +289,17 @@ def render_dashboard():
             st.info("No bookings today.")
         else:
             df = pd.DataFrame(todays_bookings)
-            df["Date"] = pd.to_datetime(df["start_time"]).dt.date
-            df["Time"] = (
-                pd.to_datetime(df["start_time"]).dt.strftime("%I:%M %p")
-                + " - "
-                + pd.to_datetime(df["end_time"]).dt.strftime("%I:%M %p")
-            )
-
-            df = df[["booked_by", "department", "Date", "Time", "purpose"]]
+
+            # Both time columns formatted in one vectorized pass
+            t = pd.to_datetime(df[["start_time", "end_time"]].stack()).dt.strftime("%I:%M %p").unstack()
+            df["Time"] = t["start_time"] + " - " + t["end_time"]
+
+            cols = ["booked_by", "department", "Time", "purpose"]
+            if len(room_names) > 1:
+                df["room"] = df["room_id"].map(room_names).fillna(DEFAULT_ROOM["name"])
+                cols.insert(3, "room")
+
+            df = df[cols]
             df.index = df.index + 1
 
             st.dataframe(df, use_container_width=True, height=480)
@@ -1,114 +1,21 @@
 import streamlit as st
 import base64
-import mysql.connector
 import bcrypt
-import boto3
-import json
 import random
 import string
-import traceback
-import smtplib
-from email.mime.text import MIMEText
+
+import db
+from mailer import send_email
 
 
 # =========================================
 #  CONFIGURATION
 # =========================================
-AWS_REGION = "ap-south-1"
-AWS_SECRET_NAME = "arn:aws:secretsmanager:ap-south-1:034362058776:secret:Wheelbrand-zM6npS"
-
 LOGO_PATH = "zodopt.png"
 LOGO_PLACEHOLDER_TEXT = "ZODOPT"
 HEADER_GRADIENT = "linear-gradient(90deg, #50309D, #7A42FF)"
 
 
-# =========================================
-#  SECRETS (SMTP + DB)
-# =========================================
-@st.cache_resource
-def get_credentials():
-    """Load all credentials from AWS Secrets Manager"""
-    try:
-        client = boto3.client("secretsmanager", region_name=AWS_REGION)
-        resp = client.get_secret_value(SecretId=AWS_SECRET_NAME)
-        creds = json.loads(resp["SecretString"])
-
-        return {
-            "DB_HOST": creds["DB_HOST"],
-            "DB_USER": creds["DB_USER"],
-            "DB_PASSWORD": creds["DB_PASSWORD"],
-            "DB_NAME": creds["DB_NAME"],
-
-            # SMTP CREDENTIALS
-            "SMTP_HOST": creds["SMTP_HOST"],
-            "SMTP_PORT": int(creds["SMTP_PORT"]),
-            "SMTP_USER": creds["SMTP_USER"],
-            "SMTP_PASSWORD": creds["SMTP_PASSWORD"],
-        }
-    except Exception as e:
-        st.error(f"Failed to load secrets: {e}")
-        st.write(traceback.format_exc())
-        st.stop()
-
-
-# =========================================
-#  SMTP EMAIL SENDER
-# =========================================
-def send_email(to_email, subject, body):
-    creds = get_credentials()
-
-    try:
-        msg = MIMEText(body, "plain")
-        msg["Subject"] = subject
-        msg["From"] = creds["SMTP_USER"]
-        msg["To"] = to_email
-
-        # SSL or STARTTLS
-        if creds["SMTP_PORT"] == 465:
-            server = smtplib.SMTP_SSL(creds["SMTP_HOST"], creds["SMTP_PORT"])
-        else:
-            server = smtplib.SMTP(creds["SMTP_HOST"], creds["SMTP_PORT"])
-            server.starttls()
-
-        server.login(creds["SMTP_USER"], creds["SMTP_PASSWORD"])
-        server.sendmail(creds["SMTP_USER"], to_email, msg.as_string())
-        server.quit()
-        return True
-
-    except Exception as e:
-        st.error(f"Email failed: {e}")
-        return False
-
-
-# =========================================
-#  DB CONNECTION
-# =========================================
-def get_db_connection():
-    c = get_credentials()
-    try:
-        return mysql.connector.connect(
-            host=c["DB_HOST"],
-            user=c["DB_USER"],
-            password=c["DB_PASSWORD"],
-            database=c["DB_NAME"],
-            autocommit=True,
-            charset="utf8mb4",
-        )
-    except:
-        return None
-
-
-def get_live_conn():
-    conn = get_db_connection()
-    if conn:
-        try:
-            conn.ping(reconnect=True, attempts=2, delay=1)
-            return conn
-        except:
-            return get_db_connection()
-    return None
-
-
 # =========================================
 #  SECURITY
 # =========================================
@@ -143,8 +50,6 @@ def set_auth_view(view):
 #  LOGIN VIEW
 # =========================================
 def render_login_view():
-    conn = get_live_conn()
-
     with st.form("conf_login_form"):
         email = st.text_input("Email ID")
         password = st.text_input("Password", type="password")
@@ -155,20 +60,18 @@ def render_login_view():
                 st.error("Enter both email and password.")
                 return
 
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("""
-                SELECT id, name, password_hash
+            user = db.fetch_one("""
+                SELECT id, name, company, password_hash
                 FROM conference_users
                 WHERE email=%s AND is_active=TRUE
             """, (email,))
-            user = cursor.fetchone()
-            cursor.close()
 
             if user and check_password(password, user["password_hash"]):
                 st.session_state["logged_in"] = True
                 st.session_state["user_id"] = user["id"]
                 st.session_state["user_email"] = email
                 st.session_state["user_name"] = user["name"]
+                st.session_state["user_company"] = user["company"]
                 st.session_state["current_page"] = "conference_dashboard"
                 st.success(f"Welcome {user['name']}!")
                 st.rerun()
@@ -187,8 +90,6 @@ def render_login_view():
 #  REGISTER – WITH EMAIL NOTIFICATION
 # =========================================
 def render_register_view():
-    conn = get_live_conn()
-
     DEPTS = ["SELECT", "SALES", "HR", "FINANCE", "DELIVERY/TECH", "DIGITAL MARKETING", "IT"]
 
     with st.form("conf_register_form"):
@@ -214,15 +115,16 @@ def render_register_view():
                 st.error("Password must be 8+ characters.")
                 return
 
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM conference_users WHERE email=%s", (email,))
-            if cursor.fetchone()[0] > 0:
+            existing = db.fetch_one(
+                "SELECT COUNT(*) FROM conference_users WHERE email=%s", (email,), dictionary=False
+            )
+            if existing[0] > 0:
                 st.error("Email already registered.")
                 return
 
             hashed = hash_password(password)
 
-            cursor.execute("""
+            db.execute("""
                 INSERT INTO conference_users(name,email,company,department,password_hash)
                 VALUES(%s,%s,%s,%s,%s)
             """, (name, email, company, dept, hashed))
@@ -245,8 +147,6 @@ def render_register_view():
 #  FORGOT PASSWORD – OTP VIA EMAIL
 # =========================================
 def render_forgot_password_view():
-    conn = get_live_conn()
-
     if "reset_user_id" not in st.session_state:
         st.session_state.reset_user_id = None
         st.session_state.reset_email = None
@@ -258,10 +158,7 @@ def render_forgot_password_view():
         email = st.text_input("Enter registered Email ID", value=st.session_state.get("reset_email", ""))
 
         if st.form_submit_button("Search Account", type="primary"):
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT id FROM conference_users WHERE email=%s", (email,))
-            user = cursor.fetchone()
-            cursor.close()
+            user = db.fetch_one("SELECT id FROM conference_users WHERE email=%s", (email,))
 
             if not user:
                 st.error("Email not found.")
@@ -274,13 +171,10 @@ def render_forgot_password_view():
             # Create OTP
             otp = str(random.randint(100000, 999999))
 
-            cursor = conn.cursor()
-            cursor.execute("""
+            db.execute("""
                 INSERT INTO conference_forgotpassword (user_id, otp_code)
                 VALUES (%s, %s)
             """, (user["id"], otp))
-            conn.commit()
-            cursor.close()
 
             # Send OTP email
             send_email(
@@ -301,8 +195,7 @@ def render_forgot_password_view():
             otp_input = st.text_input("Enter 6-digit verification code")
 
             if st.form_submit_button("Verify Code", type="primary"):
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute("""
+                match = db.fetch_one("""
                     SELECT id FROM conference_forgotpassword
                     WHERE user_id=%s
                       AND otp_code=%s
@@ -311,12 +204,9 @@ def render_forgot_password_view():
                     ORDER BY id DESC
                     LIMIT 1
                 """, (st.session_state.reset_user_id, otp_input))
-                match = cursor.fetchone()
 
                 if match:
-                    cursor.execute("UPDATE conference_forgotpassword SET is_used=TRUE WHERE id=%s", (match["id"],))
-                    conn.commit()
-                    cursor.close()
+                    db.execute("UPDATE conference_forgotpassword SET is_used=TRUE WHERE id=%s", (match["id"],))
 
                     st.session_state.otp_valid = True
                     st.success("Verification successful! Set new password.")
@@ -339,14 +229,11 @@ def render_forgot_password_view():
 
                 hashed = hash_password(new)
 
-                cursor = conn.cursor()
-                cursor.execute("""
+                db.execute("""
                     UPDATE conference_users
                     SET password_hash=%s, updated_at=CURRENT_TIMESTAMP
                     WHERE id=%s
                 """, (hashed, st.session_state.reset_user_id))
-                conn.commit()
-                cursor.close()
 
                 st.session_state.reset_email = None
                 st.session_state.reset_user_id = None
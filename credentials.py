@@ -0,0 +1,134 @@
+import os
+import json
+import logging
+import threading
+import time
+
+
+# =====================================================
+# CONFIG
+# =====================================================
+AWS_REGION = "ap-south-1"
+AWS_SECRET_NAME = "arn:aws:secretsmanager:ap-south-1:034362058776:secret:Wheelbrand-zM6npS"
+
+CREDENTIALS_TTL = 3600       # seconds a fetched secret is considered fresh
+REFRESH_MARGIN = 300         # refresh this long before the TTL runs out
+RETRY_INTERVAL = 60          # retry delay after a failed background refresh
+
+# Offline / test runs: point WHEELBRAND_SECRETS_FILE at a JSON file with the
+# same keys as the AWS secret, or export the keys as environment variables.
+LOCAL_SECRETS_FILE = os.environ.get("WHEELBRAND_SECRETS_FILE", "secrets.local.json")
+
+SECRET_KEYS = (
+    "DB_HOST", "DB_USER", "DB_PASSWORD", "DB_NAME",
+    "SMTP_HOST", "SMTP_PORT", "SMTP_USER", "SMTP_PASSWORD",
+)
+
+log = logging.getLogger(__name__)
+
+
+# =====================================================
+# SOURCES
+# =====================================================
+def _from_aws():
+    import boto3   # not needed for offline runs
+
+    client = boto3.client("secretsmanager", region_name=AWS_REGION)
+    resp = client.get_secret_value(SecretId=AWS_SECRET_NAME)
+    return json.loads(resp["SecretString"])
+
+
+def _from_local():
+    """Secrets file if present, otherwise environment variables; None if neither is complete."""
+    if os.path.exists(LOCAL_SECRETS_FILE):
+        with open(LOCAL_SECRETS_FILE) as f:
+            return json.load(f)
+
+    env = {k: os.environ[k] for k in SECRET_KEYS if k in os.environ}
+    if len(env) == len(SECRET_KEYS):
+        return env
+    return None
+
+
+def _prefer_local():
+    return "WHEELBRAND_SECRETS_FILE" in os.environ or all(k in os.environ for k in SECRET_KEYS)
+
+
+def _fetch():
+    if _prefer_local():
+        creds = _from_local()
+        if creds is not None:
+            return creds
+
+    try:
+        return _from_aws()
+    except Exception:
+        creds = _from_local()
+        if creds is None:
+            raise
+        log.warning("AWS Secrets Manager unavailable, using local credentials.")
+        return creds
+
+
+# =====================================================
+# PROVIDER
+# =====================================================
+_creds = None
+_expires_at = 0.0
+_lock = threading.Lock()
+_timer = None
+
+
+def _schedule_refresh(delay):
+    global _timer
+    if _timer is not None:
+        _timer.cancel()
+    _timer = threading.Timer(delay, _background_refresh)
+    _timer.daemon = True
+    _timer.start()
+
+
+def _store(creds):
+    global _creds, _expires_at
+    _creds = creds
+    _expires_at = time.monotonic() + CREDENTIALS_TTL
+    _schedule_refresh(max(CREDENTIALS_TTL - REFRESH_MARGIN, 1))
+
+
+def _background_refresh():
+    try:
+        creds = _fetch()
+    except Exception as e:
+        # Keep serving the last good secret; the next attempt comes soon.
+        log.warning("Credential refresh failed: %s", e)
+        with _lock:
+            _schedule_refresh(RETRY_INTERVAL)
+        return
+
+    with _lock:
+        _store(creds)
+
+
+def get_credentials():
+    """
+    Shared credentials dict for every module.
+
+    Fetched once per process and refreshed in the background before the TTL
+    runs out, so page renders never wait on Secrets Manager after the first.
+    """
+    if _creds is not None and time.monotonic() < _expires_at:
+        return _creds
+
+    with _lock:
+        if _creds is None:
+            _store(_fetch())
+        # A stale secret (background refresh still failing) is still served.
+        return _creds
+
+
+def refresh_credentials():
+    """Force a synchronous re-fetch, e.g. after a rotated password is rejected."""
+    creds = _fetch()
+    with _lock:
+        _store(creds)
+    return creds
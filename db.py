@@ -0,0 +1,297 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import errorcode, pooling
+
+import schema
+from credentials import get_credentials, refresh_credentials
+
+
+# =====================================================
+# CONFIG
+# =====================================================
+DEFAULT_DB_PORT = 3306
+
+POOL_NAME = "wheelbrand"
+POOL_SIZE = 8
+POOL_CHECKOUT_TIMEOUT = 10   # seconds a session waits for a free connection
+
+FETCH_WORKERS = 4            # fetch_parallel threads, shared by all sessions
+
+log = logging.getLogger(__name__)
+
+
+# =====================================================
+# POOL
+# =====================================================
+_pool = None
+_pool_config = None
+_pool_slots = threading.BoundedSemaphore(POOL_SIZE)
+_pool_lock = threading.Lock()
+
+
+def _load_db_config():
+    c = get_credentials()
+    return {
+        "host": c["DB_HOST"],
+        "user": c["DB_USER"],
+        "password": c["DB_PASSWORD"],
+        "database": c["DB_NAME"],
+        "port": int(c.get("DB_PORT", DEFAULT_DB_PORT)),
+        "autocommit": True,
+        "charset": "utf8mb4",
+        "consume_results": True,   # unread rows never block the pool reset
+        "connection_timeout": 10,
+    }
+
+
+def _new_pool(config):
+    return pooling.MySQLConnectionPool(
+        pool_name=POOL_NAME,
+        pool_size=POOL_SIZE,
+        pool_reset_session=True,
+        **config,
+    )
+
+
+def get_pool():
+    """
+    Process-wide pool, created on first use and shared by every session.
+
+    The pool keeps the config it was built with, so when the credentials
+    refresh hands out a different DB secret (a rotated password) it is
+    replaced; connections still checked out return to the old one.
+    """
+    global _pool, _pool_config
+    config = _load_db_config()
+    if _pool is None or config != _pool_config:
+        with _pool_lock:
+            if _pool is None:
+                pool = _new_pool(config)
+                conn = pool.get_connection()
+                try:
+                    schema.ensure(conn)   # raises SchemaError if a migration failed
+                finally:
+                    conn.close()
+                _pool, _pool_config = pool, config
+            elif config != _pool_config:
+                log.info("Database credentials changed, rebuilding the connection pool")
+                _pool, _pool_config = _new_pool(config), config
+    return _pool
+
+
+def _access_denied(err):
+    # ping(reconnect=True) wraps the login error in an InterfaceError
+    return any(
+        getattr(e, "errno", None) == errorcode.ER_ACCESS_DENIED_ERROR
+        for e in (err, err.__cause__)
+    )
+
+
+def _checkout():
+    conn = get_pool().get_connection()
+    try:
+        conn.ping(reconnect=True, attempts=2, delay=1)
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+
+@contextmanager
+def get_connection():
+    """
+    Check a connection out of the pool for one operation.
+
+    mysql.connector raises PoolError instead of waiting when the pool is
+    exhausted, so checkouts are gated by a semaphore of the same size and
+    concurrent sessions queue here. The connection is pinged (and reconnected
+    if the server dropped it) before use and always returned on exit. A login
+    rejected with access denied re-fetches the secret once, in case the
+    password was rotated before the background refresh picked it up.
+    """
+    if not _pool_slots.acquire(timeout=POOL_CHECKOUT_TIMEOUT):
+        raise TimeoutError("Timed out waiting for a database connection.")
+
+    conn = None
+    try:
+        try:
+            conn = _checkout()
+        except mysql.connector.Error as e:
+            if not _access_denied(e):
+                raise
+            refresh_credentials()
+            conn = _checkout()
+        yield conn
+    finally:
+        if conn is not None:
+            conn.close()   # returns it to the pool
+        _pool_slots.release()
+
+
+@contextmanager
+def get_cursor(dictionary=False):
+    with get_connection() as conn:
+        cur = conn.cursor(dictionary=dictionary)
+        try:
+            yield cur
+        finally:
+            cur.close()
+
+
+@contextmanager
+def transaction(dictionary=False):
+    """
+    Cursor inside an explicit transaction: committed on normal exit, rolled
+    back if the block raises.
+    """
+    with get_connection() as conn:
+        conn.start_transaction()
+        cur = conn.cursor(dictionary=dictionary)
+        try:
+            yield cur
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+
+# =====================================================
+# SINGLE-FLIGHT
+# =====================================================
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _copy_rows(result):
+    # Every caller gets its own rows; only the query is shared.
+    if isinstance(result, list):
+        return [dict(r) if isinstance(r, dict) else r for r in result]
+    if isinstance(result, dict):
+        return dict(result)
+    return result
+
+
+def single_flight(key, fn):
+    """
+    Run fn() once for all callers that ask for `key` while it is running:
+    the first caller executes, the rest wait and get a copy of its result
+    (or its exception). Nothing is kept once the call finishes, so this
+    only caps fan-out during bursts; it is not a cache.
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return _copy_rows(flight.result)
+
+    try:
+        flight.result = fn()
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+    return _copy_rows(flight.result)
+
+
+def _flight_key(kind, query, params, dictionary):
+    """(kind, query, params) as a dict key, or None if params aren't hashable."""
+    if isinstance(params, list):
+        params = tuple(params)
+    key = (kind, query, params, dictionary)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+# =====================================================
+# QUERY HELPERS
+# =====================================================
+def fetch_all(query, params=None, dictionary=True, coalesce=False):
+    """
+    coalesce=True shares one execution between concurrent identical calls
+    (see single_flight). Only for reads that can tolerate a result that
+    started a few milliseconds before the caller did.
+    """
+    def run():
+        with get_cursor(dictionary=dictionary) as cur:
+            cur.execute(query, params)
+            return cur.fetchall()
+
+    key = _flight_key("all", query, params, dictionary) if coalesce else None
+    return single_flight(key, run) if key else run()
+
+
+def fetch_one(query, params=None, dictionary=True, coalesce=False):
+    def run():
+        with get_cursor(dictionary=dictionary) as cur:
+            cur.execute(query, params)
+            return cur.fetchone()
+
+    key = _flight_key("one", query, params, dictionary) if coalesce else None
+    return single_flight(key, run) if key else run()
+
+
+_fetch_executor = None
+_fetch_executor_lock = threading.Lock()
+
+
+def _get_fetch_executor():
+    global _fetch_executor
+    if _fetch_executor is None:
+        with _fetch_executor_lock:
+            if _fetch_executor is None:
+                _fetch_executor = ThreadPoolExecutor(
+                    max_workers=FETCH_WORKERS, thread_name_prefix="db-fetch"
+                )
+    return _fetch_executor
+
+
+def fetch_parallel(*calls):
+    """
+    Run independent zero-argument read functions concurrently, each on its
+    own pooled connection, and return their results in order. The first
+    runs in the calling thread. The first exception raised is re-raised.
+
+    The functions must not touch st.* (no script context in worker threads)
+    and must not call fetch_parallel themselves.
+    """
+    if len(calls) < 2:
+        return [c() for c in calls]
+
+    futures = [_get_fetch_executor().submit(c) for c in calls[1:]]
+    first = calls[0]()
+    return [first] + [f.result() for f in futures]
+
+
+def execute(query, params=None):
+    """Run a single write. Returns (lastrowid, rowcount)."""
+    with get_cursor() as cur:
+        cur.execute(query, params)
+        return cur.lastrowid, cur.rowcount
+
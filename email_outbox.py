@@ -0,0 +1,206 @@
+"""
+Durable email outbox.
+
+Page code writes messages to the email_outbox table and returns; a worker
+drains it in batches with rate limiting and exponential backoff. The app
+runs one in-process by default (see mailer.OUTBOX_INPROCESS_WORKER); set
+WHEELBRAND_OUTBOX_INPROCESS=0 when running it as its own process instead.
+
+    python email_outbox.py        # run the worker process
+"""
+import base64
+import hashlib
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+
+
+# =====================================================
+# CONFIG
+# =====================================================
+BATCH_SIZE = 20
+POLL_INTERVAL = 2            # seconds between empty polls
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = 30            # seconds; doubles per failed attempt
+BACKOFF_MAX = 3600
+SENDS_PER_MINUTE = 60
+STALE_CLAIM_MINUTES = 10     # reclaim rows left 'sending' by a dead worker
+CONTENT_DEDUP_WINDOW = 600   # seconds; identical keyless messages merge only within this
+
+log = logging.getLogger(__name__)
+
+
+# =====================================================
+# ENQUEUE
+# =====================================================
+def make_key(to_email, subject, body, now=None):
+    """
+    Content hash within a CONTENT_DEDUP_WINDOW bucket: a rerun or
+    double-click produces the same key, the same text sent again later
+    (a second reminder, a re-sent welcome) does not.
+    """
+    bucket = int((now if now is not None else time.time()) // CONTENT_DEDUP_WINDOW)
+    raw = "\x1f".join([to_email, subject, body, str(bucket)]).encode()
+    return "sha256:" + hashlib.sha256(raw).hexdigest()
+
+
+def _encode_attachments(attachments):
+    if not attachments:
+        return None
+    return json.dumps([
+        {"filename": name, "subtype": subtype, "data": base64.b64encode(data).decode()}
+        for name, data, subtype in attachments
+    ])
+
+
+def _decode_attachments(raw):
+    if not raw:
+        return None
+    return [
+        (a["filename"], base64.b64decode(a["data"]), a["subtype"])
+        for a in json.loads(raw)
+    ]
+
+
+def enqueue(to_email, subject, body, attachments=None, idempotency_key=None):
+    """
+    Store a message for delivery. Returns True if it was new, False if a
+    message with the same idempotency key already exists.
+    """
+    key = idempotency_key or make_key(to_email, subject, body)
+    _, rowcount = db.execute("""
+        INSERT IGNORE INTO email_outbox
+            (idempotency_key, to_email, subject, body, attachments)
+        VALUES (%s, %s, %s, %s, %s)
+    """, (key, to_email, subject, body, _encode_attachments(attachments)))
+    return rowcount == 1
+
+
+# =====================================================
+# WORKER
+# =====================================================
+class RateLimiter:
+    """Spaces sends evenly so bursts don't trip the SMTP provider's limits."""
+
+    def __init__(self, per_minute):
+        self._interval = 60.0 / per_minute
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self._interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def backoff_seconds(attempts):
+    delay = min(BACKOFF_BASE * (2 ** (attempts - 1)), BACKOFF_MAX)
+    return int(delay * random.uniform(0.8, 1.2))
+
+
+def claim_batch(worker_id, limit=BATCH_SIZE):
+    db.execute("""
+        UPDATE email_outbox
+        SET status='sending', claimed_by=%s, claimed_at=NOW()
+        WHERE (status='pending' AND next_attempt_at <= NOW())
+           OR (status='sending' AND claimed_at < NOW() - INTERVAL %s MINUTE)
+        ORDER BY id
+        LIMIT %s
+    """, (worker_id, STALE_CLAIM_MINUTES, limit))
+
+    return db.fetch_all("""
+        SELECT id, to_email, subject, body, attachments, attempts
+        FROM email_outbox
+        WHERE claimed_by=%s AND status='sending'
+        ORDER BY id
+    """, (worker_id,))
+
+
+def mark_sent(row_id):
+    db.execute("""
+        UPDATE email_outbox
+        SET status='sent', sent_at=NOW(), attempts=attempts+1,
+            claimed_by=NULL, last_error=NULL
+        WHERE id=%s
+    """, (row_id,))
+
+
+def mark_failed(row_id, attempts, error):
+    attempts += 1
+    if attempts >= MAX_ATTEMPTS:
+        db.execute("""
+            UPDATE email_outbox
+            SET status='failed', attempts=%s, last_error=%s, claimed_by=NULL
+            WHERE id=%s
+        """, (attempts, str(error)[:1000], row_id))
+    else:
+        db.execute("""
+            UPDATE email_outbox
+            SET status='pending', attempts=%s, last_error=%s, claimed_by=NULL,
+                next_attempt_at=NOW() + INTERVAL %s SECOND
+            WHERE id=%s
+        """, (attempts, str(error)[:1000], backoff_seconds(attempts), row_id))
+
+
+def run_worker(stop_event=None):
+    import mailer   # imported lazily: mailer imports this module
+
+    dispatcher = mailer.get_dispatcher()
+    limiter = RateLimiter(SENDS_PER_MINUTE)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"[:64]
+    stop_event = stop_event or threading.Event()
+
+    def deliver(row):
+        limiter.wait()
+        try:
+            dispatcher.deliver_now(
+                row["to_email"], row["subject"], row["body"],
+                _decode_attachments(row["attachments"]),
+            )
+        except Exception as e:
+            log.warning("Outbox #%s failed (attempt %s): %s", row["id"], row["attempts"] + 1, e)
+            mark_failed(row["id"], row["attempts"], e)
+        else:
+            mark_sent(row["id"])
+
+    with ThreadPoolExecutor(max_workers=mailer.MAX_CONCURRENT_SENDS) as pool:
+        while not stop_event.is_set():
+            try:
+                batch = claim_batch(worker_id)
+            except Exception as e:
+                log.error("Outbox poll failed: %s", e)
+                batch = []
+
+            if not batch:
+                stop_event.wait(POLL_INTERVAL)
+                continue
+
+            list(pool.map(deliver, batch))
+
+
+_worker_thread = None
+_worker_lock = threading.Lock()
+
+
+def start_background_worker():
+    """Run the drain loop in a daemon thread of this process."""
+    global _worker_thread
+    with _worker_lock:
+        if _worker_thread is None:
+            _worker_thread = threading.Thread(target=run_worker, name="email-outbox", daemon=True)
+            _worker_thread.start()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    run_worker()
@@ -0,0 +1,32 @@
+"""
+India Standard Time helpers.
+
+Timestamps are stored as naive UTC; these turn an IST calendar day into
+the UTC range the queries compare against. Kept free of streamlit so the
+registry and the auto-checkout script can import it too.
+"""
+from datetime import datetime, timedelta, timezone
+
+try:
+    from zoneinfo import ZoneInfo
+    ZONE_IST = ZoneInfo("Asia/Kolkata")
+except Exception:
+    # Fixed offset when zoneinfo is unavailable (IST has no DST)
+    ZONE_IST = timezone(timedelta(hours=5, minutes=30))
+
+
+def ist_today():
+    return datetime.now(ZONE_IST).date()
+
+
+def ist_day_range(day):
+    """
+    [day 00:00, next day 00:00) in IST as naive UTC datetimes, matching how
+    timestamps are stored, so predicates compare the bare column (sargable).
+    """
+    start = datetime.combine(day, datetime.min.time(), tzinfo=ZONE_IST)
+    end = start + timedelta(days=1)
+    return (
+        start.astimezone(timezone.utc).replace(tzinfo=None),
+        end.astimezone(timezone.utc).replace(tzinfo=None),
+    )
@@ -0,0 +1,198 @@
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+import email_outbox
+from credentials import get_credentials
+
+
+# =====================================================
+# CONFIG
+# =====================================================
+MAX_CONCURRENT_SENDS = 3     # also the number of SMTP connections kept open
+SMTP_TIMEOUT = 15
+SMTP_IDLE_TIMEOUT = 120      # drop connections unused for this long
+
+# Every app process drains the outbox unless this is set to 0, which is only
+# safe when a separate `python email_outbox.py` process is deployed. Rows are
+# claimed, so several drainers never send the same message twice.
+OUTBOX_INPROCESS_WORKER = os.environ.get("WHEELBRAND_OUTBOX_INPROCESS", "1") != "0"
+
+log = logging.getLogger(__name__)
+
+
+# =====================================================
+# MESSAGE
+# =====================================================
+def build_message(sender, to_email, subject, body, attachments=None):
+    """attachments: list of (filename, bytes, subtype) tuples."""
+    if not attachments:
+        msg = MIMEText(body, "plain")
+    else:
+        msg = MIMEMultipart()
+        msg.attach(MIMEText(body, "plain"))
+        for filename, data, subtype in attachments:
+            part = MIMEApplication(data, _subtype=subtype)
+            part.add_header("Content-Disposition", "attachment", filename=filename)
+            msg.attach(part)
+
+    msg["Subject"] = subject
+    msg["From"] = sender
+    msg["To"] = to_email
+    return msg
+
+
+# =====================================================
+# SMTP CONNECTION POOL
+# =====================================================
+class SmtpPool:
+    """Authenticated SMTP connections, reused across sends."""
+
+    def __init__(self, size):
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def _connect(self):
+        creds = get_credentials()
+        port = int(creds["SMTP_PORT"])
+
+        if port == 465:
+            server = smtplib.SMTP_SSL(creds["SMTP_HOST"], port, timeout=SMTP_TIMEOUT)
+        else:
+            server = smtplib.SMTP(creds["SMTP_HOST"], port, timeout=SMTP_TIMEOUT)
+            server.starttls()
+
+        server.login(creds["SMTP_USER"], creds["SMTP_PASSWORD"])
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            pass
+
+    def acquire(self):
+        while True:
+            try:
+                server, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+
+            if time.monotonic() - last_used > SMTP_IDLE_TIMEOUT:
+                self._close(server)
+                continue
+            try:
+                server.noop()
+                return server
+            except Exception:
+                self._close(server)
+
+    def release(self, server):
+        try:
+            self._idle.put_nowait((server, time.monotonic()))
+        except queue.Full:
+            self._close(server)
+
+    def discard(self, server):
+        self._close(server)
+
+
+# =====================================================
+# DISPATCHER
+# =====================================================
+class MailDispatcher:
+    """
+    Process-wide outgoing mail queue.
+
+    Page code calls send() and returns immediately; a background thread
+    feeds messages to a small worker pool, capped by a semaphore, that sends
+    over pooled SMTP connections.
+    """
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_SENDS):
+        self._queue = queue.Queue()
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._smtp = SmtpPool(max_concurrent)
+        self._workers = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="mail")
+        self._thread = threading.Thread(target=self._run, name="mail-dispatcher", daemon=True)
+        self._thread.start()
+
+    def send(self, to_email, subject, body, attachments=None):
+        self._queue.put((to_email, subject, body, attachments))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            self._slots.acquire()
+            self._workers.submit(self._deliver, *item)
+
+    def _deliver(self, to_email, subject, body, attachments):
+        try:
+            self.deliver_now(to_email, subject, body, attachments)
+        except Exception as e:
+            log.error("Email to %s failed: %s", to_email, e)
+        finally:
+            self._slots.release()
+
+    def deliver_now(self, to_email, subject, body, attachments=None):
+        """Send synchronously on a pooled connection. Raises on failure."""
+        sender = get_credentials()["SMTP_USER"]
+        msg = build_message(sender, to_email, subject, body, attachments).as_string()
+
+        server = self._smtp.acquire()
+        try:
+            try:
+                server.sendmail(sender, to_email, msg)
+            except smtplib.SMTPServerDisconnected:
+                # The server closed a pooled connection between noop() and send.
+                self._smtp.discard(server)
+                server = self._smtp.acquire()
+                server.sendmail(sender, to_email, msg)
+        except Exception:
+            self._smtp.discard(server)
+            raise
+        self._smtp.release(server)
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = MailDispatcher()
+    return _dispatcher
+
+
+def ensure_outbox_worker():
+    """Start this process's outbox drainer, unless it runs as its own process."""
+    if OUTBOX_INPROCESS_WORKER:
+        email_outbox.start_background_worker()
+
+
+def send_email(to_email, subject, body, attachments=None, idempotency_key=None):
+    """
+    Queue an email for background delivery. Returns immediately.
+
+    The message goes to the durable email_outbox table (deduplicated on
+    idempotency_key). Only if that write fails is it handed straight to the
+    in-process dispatcher, so mail is still attempted during a DB outage.
+    """
+    ensure_outbox_worker()
+
+    try:
+        email_outbox.enqueue(to_email, subject, body, attachments, idempotency_key)
+    except Exception as e:
+        log.warning("Outbox write failed, sending directly: %s", e)
+        get_dispatcher().send(to_email, subject, body, attachments)
+    return True
@@ -1,21 +1,7 @@
-import streamlit as st
+import importlib
+import threading
 
-# =====================================================
-# IMPORT ALL PAGE MODULES
-# =====================================================
-try:
-    import main_screen
-    import visitor_login
-    import visitor_dashboard
-    import visitor_primarydetails
-    import visitor_secondarydetails
-    import visitor_identity
-    import conference_login
-    import conference_dashboard
-    import conference_booking
-except Exception as e:
-    st.error(f"Module Import Error: {e}")
-    st.stop()
+import streamlit as st
 
 
 # =====================================================
@@ -32,24 +18,68 @@ st.set_page_config(
 # =====================================================
 # PAGE ROUTER CONFIG
 # =====================================================
+# Render functions are given as dotted paths and imported on first
+# navigation, so the landing page doesn't pay for boto3, mysql, PIL, pandas
+# etc. that only the inner pages need.
 PAGE_MODULES = {
     # ---------------- MAIN ----------------
-    'main_screen': main_screen.render_main_screen,
+    'main_screen': 'main_screen.render_main_screen',
 
     # ---------------- VISITOR FLOW ----------------
-    'visitor_login': visitor_login.render_visitor_login_page,
-    'visitor_dashboard': visitor_dashboard.render_dashboard,
-    'visitor_primarydetails': visitor_primarydetails.render_primary_form,
-    'visitor_secondarydetails': visitor_secondarydetails.render_secondary_form,
-    'visitor_identity': visitor_identity.render_identity_page,
-    'visitor_pass': visitor_identity.render_pass_page,
+    'visitor_login': 'visitor_login.render_visitor_login_page',
+    'visitor_dashboard': 'visitor_dashboard.render_dashboard',
+    'visitor_primarydetails': 'visitor_primarydetails.render_primary_form',
+    'visitor_secondarydetails': 'visitor_secondarydetails.render_secondary_form',
+    'visitor_identity': 'visitor_identity.render_identity_page',
+    'visitor_pass': 'visitor_identity.render_pass_page',
 
     # ---------------- CONFERENCE FLOW ----------------
-    'conference_login': conference_login.render_conference_login_page,
-    'conference_dashboard': conference_dashboard.render_dashboard,
-    'conference_bookings': conference_booking.render_booking_page,
+    'conference_login': 'conference_login.render_conference_login_page',
+    'conference_dashboard': 'conference_dashboard.render_dashboard',
+    'conference_bookings': 'conference_booking.render_booking_page',
 }
 
+# Warm the remaining page modules in the background once a page is served.
+PRELOAD_PAGES = True
+
+
+# =====================================================
+# LAZY PAGE LOADING
+# =====================================================
+def resolve_page(page_key):
+    """Import and return the render function for page_key, or None if unknown."""
+    path = PAGE_MODULES.get(page_key)
+    if path is None:
+        return None
+
+    module_name, func_name = path.rsplit(".", 1)
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def _preload_all():
+    for module_name in {path.rsplit(".", 1)[0] for path in PAGE_MODULES.values()}:
+        try:
+            importlib.import_module(module_name)
+        except Exception:
+            # Surfaced properly when the page is actually opened.
+            pass
+
+
+def _start_outbox_worker():
+    # Mail queued before a restart is delivered without waiting for a new send.
+    try:
+        importlib.import_module("mailer").ensure_outbox_worker()
+    except Exception:
+        pass
+
+
+@st.cache_resource
+def start_preload():
+    """Runs once per process: later navigations find the modules already imported."""
+    if PRELOAD_PAGES:
+        threading.Thread(target=_preload_all, name="page-preload", daemon=True).start()
+    threading.Thread(target=_start_outbox_worker, name="outbox-start", daemon=True).start()
+
 
 # =====================================================
 # SESSION INITIALIZATION
@@ -73,7 +103,12 @@ def main():
     initialize_session_state()
 
     current_page = st.session_state.get("current_page", "main_screen")
-    render_function = PAGE_MODULES.get(current_page)
+
+    try:
+        render_function = resolve_page(current_page)
+    except Exception as e:
+        st.error(f"Module Import Error: {e}")
+        st.stop()
 
     if render_function is None:
         st.error(f"⛔ Page '{current_page}' not found in router.")
@@ -85,6 +120,7 @@ def main():
 
     try:
         render_function()
+        start_preload()
 
     except Exception as e:
         st.error(f"⚠ Error while rendering '{current_page}': {e}")
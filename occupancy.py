@@ -0,0 +1,208 @@
+"""
+Who is in the building right now.
+
+A process-wide registry of today's open visits (pass issued today in IST,
+not checked out), grouped by company. It is seeded from `visitors` once and kept current by
+the check-in and checkout paths, so counts are O(1) and an evacuation
+roll-call needs no query. Writes from other processes (another app server,
+a cron sweep) are picked up by a periodic re-seed.
+
+    python occupancy.py [out.html]    # building-wide roll-call, all companies
+"""
+import base64
+import html
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import db
+from ist_time import ZONE_IST, ist_day_range, ist_today
+
+
+# =====================================================
+# CONFIG
+# =====================================================
+RESEED_INTERVAL = 300   # seconds
+THUMBNAIL_PX = 56
+
+
+# =====================================================
+# REGISTRY
+# =====================================================
+class OccupancyRegistry:
+    def __init__(self):
+        self._inside = {}          # company_id -> {visitor_id: entry}
+        self._company_names = {}
+        self._seeded_at = None
+        self._seeded_day = None
+        self._lock = threading.Lock()
+
+    def _seed_locked(self):
+        # Same window as the dashboard counts: visits left open on earlier
+        # days are not "inside" (the auto-checkout sweep is optional).
+        day = ist_today()
+        start, end = ist_day_range(day)
+        rows = db.fetch_all("""
+            SELECT v.visitor_id, v.company_id, c.company_name,
+                   v.full_name, v.phone_number, v.from_company, v.person_to_meet,
+                   v.registration_timestamp, MAX(i.photo_url) AS photo_url
+            FROM visitors v
+            LEFT JOIN companies c ON c.id=v.company_id
+            LEFT JOIN visitor_identity i ON i.visitor_id=v.visitor_id
+            WHERE v.checkout_time IS NULL AND v.pass_generated=1
+              AND v.registration_timestamp >= %s AND v.registration_timestamp < %s
+            GROUP BY v.visitor_id
+        """, (start, end))
+        inside = {}
+        for r in rows:
+            self._company_names[r["company_id"]] = r.pop("company_name")
+            inside.setdefault(r["company_id"], {})[r["visitor_id"]] = r
+        self._inside = inside
+        self._seeded_at = time.monotonic()
+        self._seeded_day = day
+
+    def _ensure_seeded(self):
+        with self._lock:
+            if (self._seeded_at is None
+                    or self._seeded_day != ist_today()
+                    or time.monotonic() - self._seeded_at > RESEED_INTERVAL):
+                self._seed_locked()
+
+    # ---------- updates ----------
+    def check_in(self, visitor, photo_url=None, company_name=None, thumbnail=None):
+        """
+        Record a visitor whose pass was just issued. `thumbnail` is the
+        ingested JPEG thumbnail, kept for the printable roll-call.
+        """
+        with self._lock:
+            if self._seeded_at is None or self._seeded_day != ist_today():
+                return   # the next seed will read it from the DB
+            start, end = ist_day_range(self._seeded_day)
+            registered = visitor.get("registration_timestamp")
+            if registered is not None and not start <= registered < end:
+                return   # an earlier day's visit
+            entry = {
+                k: visitor.get(k) for k in (
+                    "visitor_id", "company_id", "full_name", "phone_number",
+                    "from_company", "person_to_meet", "registration_timestamp",
+                )
+            }
+            entry["photo_url"] = photo_url
+            entry["thumbnail"] = thumbnail
+            self._inside.setdefault(entry["company_id"], {})[entry["visitor_id"]] = entry
+            if company_name:
+                self._company_names[entry["company_id"]] = company_name
+
+    def set_photo(self, company_id, visitor_id, photo_url):
+        with self._lock:
+            entry = self._inside.get(company_id, {}).get(visitor_id)
+            if entry is not None:
+                entry["photo_url"] = photo_url
+
+    def check_out(self, company_id, visitor_ids):
+        with self._lock:
+            company = self._inside.get(company_id)
+            if company:
+                for vid in visitor_ids:
+                    company.pop(vid, None)
+
+    # ---------- reads ----------
+    def count(self, company_id):
+        self._ensure_seeded()
+        return len(self._inside.get(company_id, ()))
+
+    def inside(self, company_id):
+        """Everyone of one company still inside, longest-present first."""
+        self._ensure_seeded()
+        with self._lock:
+            rows = list(self._inside.get(company_id, {}).values())
+        return sorted(rows, key=lambda r: r["registration_timestamp"] or datetime.min)
+
+    def building(self):
+        """{company name: [entries]} for every company, for building security."""
+        self._ensure_seeded()
+        with self._lock:
+            companies = {cid: list(v.values()) for cid, v in self._inside.items() if v}
+            names = dict(self._company_names)
+        return {
+            names.get(cid) or f"Company {cid}":
+                sorted(rows, key=lambda r: r["registration_timestamp"] or datetime.min)
+            for cid, rows in sorted(companies.items(), key=lambda kv: str(names.get(kv[0])))
+        }
+
+
+registry = OccupancyRegistry()
+
+
+# =====================================================
+# EVACUATION LIST
+# =====================================================
+def _ist(dt):
+    if not dt:
+        return "—"
+    return dt.replace(tzinfo=timezone.utc).astimezone(ZONE_IST).strftime("%d-%m-%Y %H:%M")
+
+
+def _photo_cell(row):
+    # The thumbnail is embedded so the saved page works offline; rows seeded
+    # from the DB only have the master URL, usable when it is served over http.
+    if row.get("thumbnail"):
+        data = base64.b64encode(row["thumbnail"]).decode("ascii")
+        return f'<img src="data:image/jpeg;base64,{data}">'
+    url = row.get("photo_url") or ""
+    if url.startswith(("https://", "http://")):
+        return f'<img src="{html.escape(url)}">'
+    return ""
+
+
+def evacuation_html(groups):
+    """
+    Printable roll-call page for {heading: [entries]}, with a photo thumbnail
+    and a blank tick box per person.
+    """
+    e = html.escape
+    now = datetime.now(ZONE_IST).strftime("%d-%m-%Y %H:%M")
+    total = sum(len(rows) for rows in groups.values())
+
+    sections = []
+    for heading, rows in groups.items():
+        body = "".join(
+            f"<tr><td class='box'></td>"
+            f"<td>{_photo_cell(r)}</td>"
+            f"<td>{e(r['full_name'] or '')}</td><td>{e(r['phone_number'] or '')}</td>"
+            f"<td>{e(r['from_company'] or '')}</td><td>{e(r['person_to_meet'] or '')}</td>"
+            f"<td>{_ist(r['registration_timestamp'])}</td></tr>"
+            for r in rows
+        )
+        sections.append(
+            f"<h2>{e(str(heading))} — {len(rows)}</h2>"
+            "<table><tr><th>✓</th><th>Photo</th><th>Name</th><th>Phone</th>"
+            "<th>From</th><th>Meeting</th><th>Since</th></tr>"
+            f"{body}</table>"
+        )
+
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Evacuation roll-call {now}</title>
+<style>
+body {{font-family:sans-serif; margin:24px;}}
+table {{border-collapse:collapse; width:100%; margin-bottom:24px;}}
+th, td {{border:1px solid #999; padding:6px; text-align:left; font-size:14px;}}
+img {{width:{THUMBNAIL_PX}px; height:{THUMBNAIL_PX}px; object-fit:cover;}}
+td.box {{width:28px;}}
+h2 {{page-break-after:avoid;}}
+@media print {{ table {{page-break-inside:auto;}} tr {{page-break-inside:avoid;}} }}
+</style></head>
+<body><h1>Evacuation roll-call</h1>
+<p>Generated {now} IST · {total} people inside</p>
+{''.join(sections) or '<p>Nobody is checked in.</p>'}
+</body></html>"""
+
+
+if __name__ == "__main__":
+    page = evacuation_html(registry.building())
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "w", encoding="utf-8") as f:
+            f.write(page)
+    else:
+        print(page)
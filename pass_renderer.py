@@ -0,0 +1,106 @@
+"""
+Visitor pass rendering.
+
+Fonts, the logo (read from images/ in the repo, no network) and the static
+part of the card are prepared once per process. Rendering a pass is then
+one copy of the base card, a photo paste and the variable text.
+"""
+import os
+import threading
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+
+# =====================================================
+# CONFIG
+# =====================================================
+CARD_SIZE = (700, 1000)
+PHOTO_SIZE = (230, 230)
+PHOTO_POS = (235, 220)
+LOGO_SIZE = (200, 60)
+LOGO_POS = (250, 40)
+TITLE_POS = (230, 140)
+TEXT_POS = (140, 500)
+LINE_HEIGHT = 60
+ACCENT = "#4B2ECF"
+JPEG_QUALITY = 85
+
+FONT_BOLD = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+FONT_REGULAR = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images", "zodopt.png")
+
+
+# =====================================================
+# PROCESS-WIDE ASSETS
+# =====================================================
+_assets = None
+_assets_lock = threading.Lock()
+
+
+def _load_font(path, size):
+    try:
+        return ImageFont.truetype(path, size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def _load_logo():
+    try:
+        with Image.open(LOGO_PATH) as im:
+            return im.convert("RGBA").resize(LOGO_SIZE, Image.LANCZOS)
+    except OSError:
+        return None
+
+
+def _build_base_card(font_title, logo):
+    card = Image.new("RGB", CARD_SIZE, "white")
+    draw = ImageDraw.Draw(card)
+    draw.rectangle((8, 8, CARD_SIZE[0] - 9, CARD_SIZE[1] - 9), outline=ACCENT, width=4)
+    if logo is not None:
+        card.paste(logo, LOGO_POS, logo)
+    draw.text(TITLE_POS, "Visitor Pass", fill=ACCENT, font=font_title)
+    x, y = PHOTO_POS
+    draw.rectangle((x - 3, y - 3, x + PHOTO_SIZE[0] + 2, y + PHOTO_SIZE[1] + 2), outline=ACCENT, width=3)
+    return card
+
+
+def get_assets():
+    """(base card, text font), built on first use."""
+    global _assets
+    if _assets is None:
+        with _assets_lock:
+            if _assets is None:
+                font_title = _load_font(FONT_BOLD, 48)
+                font_text = _load_font(FONT_REGULAR, 32)
+                _assets = (_build_base_card(font_title, _load_logo()), font_text)
+    return _assets
+
+
+# =====================================================
+# RENDER
+# =====================================================
+def render_pass(photo, lines):
+    """
+    JPEG bytes of a pass: `photo` is a PIL image (or JPEG/PNG bytes) and
+    `lines` the (label, value) rows printed under it.
+    """
+    base, font_text = get_assets()
+    card = base.copy()
+
+    if isinstance(photo, (bytes, bytearray)):
+        photo = Image.open(BytesIO(photo))
+    if photo.size != PHOTO_SIZE:
+        # Crop to the slot's aspect ratio instead of stretching
+        photo = ImageOps.fit(photo, PHOTO_SIZE, method=Image.BILINEAR)
+    card.paste(photo.convert("RGB"), PHOTO_POS)
+
+    draw = ImageDraw.Draw(card)
+    x, y = TEXT_POS
+    for label, value in lines:
+        draw.text((x, y), f"{label}: {value}", font=font_text, fill="black")
+        y += LINE_HEIGHT
+
+    out = BytesIO()
+    card.save(out, format="JPEG", quality=JPEG_QUALITY)
+    return out.getvalue()
@@ -0,0 +1,50 @@
+"""
+Visitor photo ingest.
+
+A camera capture is decoded once, turned upright, centre-cropped to a
+square and downsized. Everything after that works from the result: the
+compressed master is what gets stored, the decoded image is what the pass
+is rendered from, and the thumbnail is what stays in the session. Images
+are re-encoded without their EXIF block (camera, GPS, timestamps).
+"""
+from collections import namedtuple
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+
+# =====================================================
+# CONFIG
+# =====================================================
+MASTER_SIZE = (460, 460)     # 2x the pass photo slot
+MASTER_QUALITY = 82
+THUMBNAIL_SIZE = (96, 96)
+THUMBNAIL_QUALITY = 75
+RESAMPLE = Image.BILINEAR    # plenty for a downscale of this ratio, and fast
+
+
+IngestedPhoto = namedtuple("IngestedPhoto", "image master thumbnail")
+
+
+def _jpeg(image, quality):
+    out = BytesIO()
+    image.save(out, format="JPEG", quality=quality, optimize=True)
+    return out.getvalue()
+
+
+def ingest_photo(data):
+    """
+    IngestedPhoto(image, master, thumbnail) from raw JPEG/PNG bytes:
+    `image` is the square RGB master as a PIL image, `master` and
+    `thumbnail` its EXIF-free JPEG encodings.
+    """
+    with Image.open(BytesIO(data)) as im:
+        # Let the JPEG decoder drop resolution we would discard anyway
+        im.draft("RGB", (MASTER_SIZE[0] * 2, MASTER_SIZE[1] * 2))
+        im = ImageOps.exif_transpose(im).convert("RGB")
+
+    image = ImageOps.fit(im, MASTER_SIZE, method=RESAMPLE)
+    thumbnail = image.resize(THUMBNAIL_SIZE, RESAMPLE, reducing_gap=2.0)
+    return IngestedPhoto(
+        image, _jpeg(image, MASTER_QUALITY), _jpeg(thumbnail, THUMBNAIL_QUALITY)
+    )
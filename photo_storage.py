@@ -0,0 +1,191 @@
+"""
+Visitor photo storage.
+
+Every backend has the same API: put(key, data, content_type) stores bytes
+and returns the public URL, get(key) reads them back and url(key) is the
+URL without any I/O. The backend is picked by WHEELBRAND_PHOTO_STORAGE:
+
+    s3              (default) the visitor photo bucket
+    local:/some/dir files under a directory, e.g. for offline runs
+    memory          a dict, for tests and benchmarks
+
+    python photo_storage.py [count] [size_kb]   # time uploads on the configured backend
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from io import BytesIO
+from pathlib import Path
+
+
+# =====================================================
+# CONFIG
+# =====================================================
+STORAGE_SPEC = os.environ.get("WHEELBRAND_PHOTO_STORAGE", "s3")
+
+AWS_REGION = "ap-south-1"
+S3_BUCKET = os.environ.get("WHEELBRAND_PHOTO_BUCKET", "zodoptvisiorsmanagement")
+
+S3_MAX_ATTEMPTS = 4          # botocore retries throttling, 5xx and connection errors
+S3_CONNECT_TIMEOUT = 5
+S3_READ_TIMEOUT = 30
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+MULTIPART_CONCURRENCY = 4
+
+log = logging.getLogger(__name__)
+
+
+# =====================================================
+# BACKENDS
+# =====================================================
+class S3Storage:
+    def __init__(self, bucket=S3_BUCKET, region=AWS_REGION):
+        self.bucket = bucket
+        self.region = region
+        self._client = None
+        self._transfer = None
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        # boto3 clients are thread-safe; one per process keeps its
+        # connection pool and credentials warm across uploads.
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import boto3   # not needed for offline runs
+                    from boto3.s3.transfer import TransferConfig
+                    from botocore.config import Config
+
+                    self._transfer = TransferConfig(
+                        multipart_threshold=MULTIPART_THRESHOLD,
+                        multipart_chunksize=MULTIPART_CHUNKSIZE,
+                        max_concurrency=MULTIPART_CONCURRENCY,
+                    )
+                    self._client = boto3.client("s3", region_name=self.region, config=Config(
+                        retries={"max_attempts": S3_MAX_ATTEMPTS, "mode": "standard"},
+                        connect_timeout=S3_CONNECT_TIMEOUT,
+                        read_timeout=S3_READ_TIMEOUT,
+                        max_pool_connections=MULTIPART_CONCURRENCY * 4,
+                    ))
+        return self._client
+
+    def url(self, key):
+        return f"https://{self.bucket}.s3.{self.region}.amazonaws.com/{key}"
+
+    def put(self, key, data, content_type="image/jpeg"):
+        # upload_fileobj is a single PUT below the threshold and a parallel
+        # multipart upload above it.
+        client = self._get_client()
+        client.upload_fileobj(
+            BytesIO(data), self.bucket, key,
+            ExtraArgs={"ContentType": content_type},
+            Config=self._transfer,
+        )
+        return self.url(key)
+
+    def get(self, key):
+        return self._get_client().get_object(Bucket=self.bucket, Key=key)["Body"].read()
+
+
+class LocalStorage:
+    def __init__(self, root):
+        self.root = Path(root).resolve()
+
+    def _path(self, key):
+        path = (self.root / key).resolve()
+        if self.root not in path.parents:
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def url(self, key):
+        return self._path(key).as_uri()
+
+    def put(self, key, data, content_type="image/jpeg"):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".part")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        return self.url(key)
+
+    def get(self, key):
+        return self._path(key).read_bytes()
+
+
+class MemoryStorage:
+    def __init__(self):
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    def url(self, key):
+        return f"memory://{key}"
+
+    def put(self, key, data, content_type="image/jpeg"):
+        with self._lock:
+            self._objects[key] = bytes(data)
+        return self.url(key)
+
+    def get(self, key):
+        with self._lock:
+            return self._objects[key]
+
+
+# =====================================================
+# PROCESS-WIDE BACKEND
+# =====================================================
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def from_spec(spec):
+    if spec == "s3":
+        return S3Storage()
+    if spec == "memory":
+        return MemoryStorage()
+    if spec.startswith("local:"):
+        return LocalStorage(spec[len("local:"):])
+    raise ValueError(f"Unknown WHEELBRAND_PHOTO_STORAGE: {spec}")
+
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = from_spec(STORAGE_SPEC)
+    return _storage
+
+
+def set_storage(storage):
+    """Swap the backend, e.g. a MemoryStorage in a test or benchmark."""
+    global _storage
+    with _storage_lock:
+        _storage = storage
+
+
+def put(key, data, content_type="image/jpeg"):
+    start = time.perf_counter()
+    url = get_storage().put(key, data, content_type)
+    log.debug("Stored %s (%d bytes) in %.0f ms", key, len(data), (time.perf_counter() - start) * 1000)
+    return url
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    size = int(sys.argv[2]) * 1024 if len(sys.argv) > 2 else 80 * 1024
+    payload = os.urandom(size)
+
+    timings = []
+    for i in range(count):
+        start = time.perf_counter()
+        get_storage().put(f"benchmark/{os.getpid()}_{i}.bin", payload, "application/octet-stream")
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    print(f"{STORAGE_SPEC}: {count} x {size // 1024} KB  "
+          f"p50 {timings[len(timings) // 2]:.1f} ms  "
+          f"p95 {timings[min(count - 1, int(count * 0.95))]:.1f} ms  "
+          f"max {timings[-1]:.1f} ms")
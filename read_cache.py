@@ -0,0 +1,60 @@
+"""
+Short-TTL read cache shared by every session of the process.
+
+Entries are grouped per (scope, owner), e.g. ("visitors", company_id), so
+a write can drop everything cached for one company in one call. The TTL
+only bounds staleness for writes made by other processes; writes made here
+call invalidate() and are visible on the next read.
+"""
+import functools
+import threading
+import time
+
+
+# =====================================================
+# CONFIG
+# =====================================================
+DEFAULT_TTL = 5
+
+_buckets = {}        # (scope, owner) -> {key: (expires_at, value)}
+_generations = {}    # (scope, owner) -> int, bumped by invalidate()
+_lock = threading.Lock()
+
+
+def cached(scope, ttl=DEFAULT_TTL):
+    """
+    Cache fn(owner, *args) under (scope, owner). The owner (company) is the
+    first positional argument; the remaining arguments must be hashable.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(owner, *args):
+            bucket_key = (scope, owner)
+            key = (fn.__qualname__, args)
+            now = time.monotonic()
+
+            with _lock:
+                hit = _buckets.get(bucket_key, {}).get(key)
+                gen = _generations.get(bucket_key, 0)
+            if hit and hit[0] > now:
+                value = hit[1]
+            else:
+                value = fn(owner, *args)
+                with _lock:
+                    # Don't store a result an invalidate() raced past.
+                    if _generations.get(bucket_key, 0) == gen:
+                        bucket = _buckets.setdefault(bucket_key, {})
+                        for k in [k for k, (exp, _) in bucket.items() if exp <= now]:
+                            del bucket[k]
+                        bucket[key] = (now + ttl, value)
+
+            # Callers may append/sort; the cached list stays intact.
+            return list(value) if isinstance(value, list) else value
+        return wrapper
+    return decorate
+
+
+def invalidate(scope, owner):
+    with _lock:
+        _buckets.pop((scope, owner), None)
+        _generations[(scope, owner)] = _generations.get((scope, owner), 0) + 1
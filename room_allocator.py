@@ -0,0 +1,209 @@
+"""
+Automatic room allocation for "book any suitable room" bookings.
+
+Rooms are ranked best-fit by capacity first, then by how little the booking
+fragments the room's remaining free time. Auto-assigned bookings that
+haven't started yet can be re-packed for a whole day with reoptimize_day().
+
+    python room_allocator.py [YYYY-MM-DD]     # re-pack every company's day
+"""
+import logging
+import sys
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+import db
+from booking_conflicts import (
+    BookingConflict, BookingError, insert_booking, lock_company, lock_day, retry_deadlock,
+)
+from booking_recurrence import company_occurrences
+from mailer import send_email
+from room_availability import WORK_END, WORK_START, DayAvailability, get_company_rooms
+
+
+# =====================================================
+# CONFIG
+# =====================================================
+MIN_USEFUL_SLOTS = 2         # free gaps shorter than this are hard to book
+REOPTIMIZE_FREEZE = timedelta(minutes=30)   # never move a meeting this close to start
+UNKNOWN_CAPACITY_WASTE = 1000   # rooms without a capacity fit anyone, but last
+
+log = logging.getLogger(__name__)
+
+
+# =====================================================
+# SCORING
+# =====================================================
+def _gap_cost(gap):
+    # A gap of 0 is perfect packing; a stranded short gap is the worst case.
+    if gap == 0:
+        return 0
+    if gap < MIN_USEFUL_SLOTS:
+        return 10
+    return 1
+
+
+def fragmentation_cost(row, lo, hi):
+    """Cost of booking slots [lo, hi) in one room's busy row."""
+    left = row[:lo][::-1]
+    right = row[hi:]
+    gap_left = int(left.argmax()) if left.any() else left.size
+    gap_right = int(right.argmax()) if right.any() else right.size
+    return _gap_cost(gap_left) + _gap_cost(gap_right)
+
+
+def rank_rooms(avail, start, end, attendees=None):
+    """Rooms free for [start, end) that fit `attendees`, best choice first."""
+    lo, hi = avail.slot_range(start, end)
+    if lo >= hi:
+        return []
+
+    free = ~avail.busy[:, lo:hi].any(axis=1)
+    ranked = []
+    for i in np.flatnonzero(free):
+        room = avail.rooms[i]
+        cap = room.get("capacity")
+        if not attendees:
+            waste = 0
+        elif cap is None:
+            waste = UNKNOWN_CAPACITY_WASTE
+        elif cap < attendees:
+            continue
+        else:
+            waste = cap - attendees
+        ranked.append((waste, fragmentation_cost(avail.busy[i], lo, hi), room["name"], room))
+
+    ranked.sort(key=lambda t: t[:3])
+    return [t[3] for t in ranked]
+
+
+def choose_room(avail, start, end, attendees=None):
+    ranked = rank_rooms(avail, start, end, attendees)
+    return ranked[0] if ranked else None
+
+
+# =====================================================
+# BOOKING
+# =====================================================
+class NoRoomAvailable(BookingError):
+    def __init__(self):
+        super().__init__("No suitable room is free for that time.")
+
+
+def book_any_room(uid, company, avail, d, s, e, dept, purpose, attendees=None):
+    """
+    Insert into the best-ranked room, falling through to the next one if a
+    concurrent booking took it first. Returns (booking_id, room).
+    """
+    ranked = rank_rooms(avail, s, e, attendees)
+    if not ranked:
+        raise NoRoomAvailable()
+
+    for room in ranked:
+        try:
+            bid = insert_booking(
+                uid, company, d, s, e, dept, purpose, room["id"],
+                room_auto=True, attendees=attendees,
+            )
+            return bid, room
+        except BookingConflict:
+            continue
+    raise NoRoomAvailable()
+
+
+# =====================================================
+# DAY RE-OPTIMIZATION
+# =====================================================
+@retry_deadlock
+def reoptimize_day(company, day, work_start, work_end, now=None):
+    """
+    Re-pack the not-yet-started auto-assigned bookings of one company-day,
+    largest first, around the fixed ones. Returns the number of bookings
+    that changed room.
+    """
+    now = now or datetime.now()
+    rooms = get_company_rooms(company)
+    if len(rooms) < 2:
+        return 0
+
+    with db.transaction(dictionary=True) as cur:
+        lock_company(cur, company)
+        lock_day(cur, company, day)
+        cur.execute("""
+            SELECT b.id, b.room_id, b.start_time, b.end_time, b.room_auto,
+                   b.attendees, b.updated_at, u.name, u.email
+            FROM conference_users u
+            JOIN conference_bookings b ON b.user_id=u.id
+            WHERE u.company=%s AND b.booking_date=%s
+        """, (company, day))
+        rows = cur.fetchall()
+
+        movable = [
+            r for r in rows
+            if r["room_auto"] and r["start_time"] > now + REOPTIMIZE_FREEZE
+        ]
+        if not movable:
+            return 0
+
+        moving = {r["id"] for r in movable}
+        fixed = [r for r in rows if r["id"] not in moving]
+        fixed += company_occurrences(company, day, day + timedelta(days=1), cur=cur)
+        avail = DayAvailability(day, rooms, fixed, work_start, work_end)
+
+        movable.sort(key=lambda r: (r["end_time"] - r["start_time"], r["attendees"] or 0), reverse=True)
+        plan = {}
+        for r in movable:
+            room = choose_room(avail, r["start_time"], r["end_time"], r["attendees"])
+            if room is None:
+                # Greedy packing failed; keep today's assignment untouched.
+                return 0
+            avail.reserve(room["id"], r["start_time"], r["end_time"])
+            plan[r["id"]] = room
+
+        changed = [r for r in movable if plan[r["id"]]["id"] != r["room_id"]]
+        for r in changed:
+            cur.execute(
+                "UPDATE conference_bookings SET room_id=%s WHERE id=%s",
+                (plan[r["id"]]["id"], r["id"])
+            )
+
+    for r in changed:
+        room = plan[r["id"]]
+        if r["email"]:
+            send_email(
+                r["email"],
+                "Conference Room Changed",
+                f"Hello {r['name']},\n\n"
+                f"Your booking on {r['start_time'].strftime('%d-%m-%Y')} "
+                f"{r['start_time'].strftime('%I:%M %p')} - {r['end_time'].strftime('%I:%M %p')} "
+                f"has moved to room: {room['name']}.\n\nThank you,\nZODOPT MeetEase Team\n",
+                # updated_at is the version the move was planned from, so a
+                # later move back to the same room is a new message
+                idempotency_key=(
+                    f"room-change:{r['id']}:{room['id']}:{r['updated_at'].strftime('%Y%m%d%H%M%S%f')}"
+                ),
+            )
+    return len(changed)
+
+
+def reoptimize_all(day, work_start, work_end):
+    companies = db.fetch_all("""
+        SELECT DISTINCT u.company
+        FROM conference_users u
+        JOIN conference_bookings b ON b.user_id=u.id
+        WHERE b.booking_date=%s AND b.room_auto=1
+    """, (day,))
+    total = 0
+    for row in companies:
+        try:
+            total += reoptimize_day(row["company"], day, work_start, work_end)
+        except Exception as e:
+            log.error("Re-optimizing %s failed: %s", row["company"], e)
+    return total
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    day = date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else date.today()
+    log.info("Moved %s bookings", reoptimize_all(day, WORK_START, WORK_END))
@@ -0,0 +1,204 @@
+import math
+import threading
+from datetime import datetime, time, timedelta
+
+import numpy as np
+
+import db
+import read_cache
+from booking_conflicts import lock_company
+
+
+# =====================================================
+# CONFIG
+# =====================================================
+SLOT_MINUTES = 30
+
+# Bookable hours, shared by the booking page and the room re-optimizer
+WORK_START = time(9, 30)
+WORK_END = time(19, 0)
+
+# Companies that haven't set up rooms book a single implicit room, which
+# matches bookings stored before rooms existed (room_id NULL). Once a company
+# has rooms, those bookings are adopted by its first room (lowest id).
+DEFAULT_ROOM = {"id": None, "name": "Conference Room", "capacity": None}
+
+# Pass as room_id to query across every room ("book any suitable room").
+ANY_ROOM = object()
+
+
+# =====================================================
+# DB
+# =====================================================
+_adopted = set()     # companies whose room-less bookings were checked this process
+_adopted_lock = threading.Lock()
+
+
+def adopt_implicit_bookings(company, room_id):
+    """
+    Move a company's room-less bookings and series into room_id, so they
+    keep blocking a real room in availability and conflict checks.
+    Returns the number of rows moved.
+    """
+    with db.transaction() as cur:
+        lock_company(cur, company, exclusive=True)
+        cur.execute("""
+            UPDATE conference_bookings b
+            JOIN conference_users u ON u.id=b.user_id
+            SET b.room_id=%s
+            WHERE u.company=%s AND b.room_id IS NULL
+        """, (room_id, company))
+        moved = cur.rowcount
+        cur.execute("""
+            UPDATE conference_booking_series s
+            JOIN conference_users u ON u.id=s.user_id
+            SET s.room_id=%s
+            WHERE u.company=%s AND s.room_id IS NULL
+        """, (room_id, company))
+        return moved + cur.rowcount
+
+
+def get_company_rooms(company, on_adopt=None):
+    """
+    Active rooms, or [DEFAULT_ROOM] if the company has none. The first call
+    per process after rooms exist adopts the implicit room's bookings;
+    on_adopt(company) runs if any moved, to drop cached views of them.
+    """
+    rows = db.fetch_all("""
+        SELECT id, name, capacity
+        FROM conference_rooms
+        WHERE company=%s AND is_active=1
+        ORDER BY name
+    """, (company,))
+    if not rows:
+        return [DEFAULT_ROOM]
+
+    with _adopted_lock:
+        pending = company not in _adopted
+        _adopted.add(company)
+    if pending:
+        try:
+            moved = adopt_implicit_bookings(company, min(r["id"] for r in rows))
+        except Exception:
+            with _adopted_lock:
+                _adopted.discard(company)
+            raise
+        if moved:
+            read_cache.invalidate("conference", company)
+            if on_adopt:
+                on_adopt(company)
+    return rows
+
+
+# =====================================================
+# AVAILABILITY BITMAP
+# =====================================================
+class DayAvailability:
+    """
+    Busy/free bitmap for every room of one day: a (rooms x slots) bool
+    array where True means the slot is taken (booked, or already past).
+    Free-window queries are vectorized over all rooms at once.
+    """
+
+    def __init__(self, day, rooms, bookings, work_start, work_end,
+                 now=None, slot_minutes=SLOT_MINUTES, ignore_id=None):
+        self.day = day
+        self.rooms = list(rooms)
+        self.slot = timedelta(minutes=slot_minutes)
+        self.day_start = datetime.combine(day, work_start)
+        self.n_slots = int((datetime.combine(day, work_end) - self.day_start) / self.slot)
+
+        self.busy = np.zeros((len(self.rooms), self.n_slots), dtype=bool)
+        self._room_pos = {r["id"]: i for i, r in enumerate(self.rooms)}
+
+        for b in bookings:
+            if b["id"] == ignore_id:
+                continue
+            i = self._room_pos.get(b.get("room_id"))
+            if i is None:
+                continue
+            lo, hi = self.slot_range(b["start_time"], b["end_time"])
+            if lo < hi:
+                self.busy[i, lo:hi] = True
+
+        if now is not None and now.date() == day:
+            # A slot can't be booked once it has started.
+            past = min(max(self._slot_floor(now) + 1, 0), self.n_slots)
+            self.busy[:, :past] = True
+
+    # ---------- slot <-> time ----------
+    def _slot_floor(self, t):
+        return math.floor((t - self.day_start) / self.slot)
+
+    def _slot_ceil(self, t):
+        return math.ceil((t - self.day_start) / self.slot)
+
+    def slot_time(self, k):
+        return self.day_start + k * self.slot
+
+    def room_index(self, room_id):
+        return self._room_pos[room_id]
+
+    def slot_range(self, start, end):
+        lo = max(self._slot_floor(start), 0)
+        hi = min(self._slot_ceil(end), self.n_slots)
+        return lo, hi
+
+    def reserve(self, room_id, start, end):
+        lo, hi = self.slot_range(start, end)
+        self.busy[self.room_index(room_id), lo:hi] = True
+
+    # ---------- queries ----------
+    def free_mask(self, n_slots):
+        """
+        (rooms x starts) bool array: True where n_slots consecutive slots
+        from that start are all free in that room.
+        """
+        width = self.n_slots - n_slots + 1
+        if n_slots <= 0 or width <= 0:
+            return np.zeros((len(self.rooms), 0), dtype=bool)
+
+        cs = np.zeros((len(self.rooms), self.n_slots + 1), dtype=np.int32)
+        np.cumsum(self.busy, axis=1, out=cs[:, 1:])
+        return (cs[:, n_slots:] - cs[:, :width]) == 0
+
+    def first_free_windows(self, duration, limit=5):
+        """
+        Earliest `limit` free windows of `duration` across all rooms, as
+        dicts with room / start / end, ordered by start time then room.
+        """
+        n = math.ceil(duration / self.slot)
+        mask = self.free_mask(n)
+        hits = np.argwhere(mask.T)[:limit]     # (start, room), start-major
+        return [
+            {
+                "room": self.rooms[r],
+                "start": self.slot_time(k),
+                "end": self.slot_time(k + n),
+            }
+            for k, r in hits
+        ]
+
+    def _rows(self, room_id):
+        """Busy rows for one room, or for every room when room_id is ANY_ROOM."""
+        if room_id is ANY_ROOM:
+            return self.busy
+        return self.busy[[self.room_index(room_id)]]
+
+    def free_starts(self, room_id=ANY_ROOM):
+        free = ~self._rows(room_id)
+        return [self.slot_time(k) for k in np.flatnonzero(free.any(axis=0))]
+
+    def free_ends(self, room_id, start):
+        """
+        End times that keep [start, end) inside one free run of the room
+        (of at least one room, for ANY_ROOM).
+        """
+        k = self._slot_floor(start)
+        if k < 0 or k >= self.n_slots:
+            return []
+
+        rows = self._rows(room_id)[:, k:]
+        # Length of the free run starting at k, per room (0 if k is busy).
+        run = np.where(rows.any(axis=1), rows.argmax(axis=1), rows.shape[1]).max()
+        return [self.slot_time(k + i) for i in range(1, run + 1)]
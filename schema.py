@@ -0,0 +1,243 @@
+import logging
+import os
+import sys
+
+from mysql.connector import errorcode
+
+
+# =====================================================
+# DDL
+# =====================================================
+# Applied by `python schema.py`, or on pool creation when a required column
+# is missing (see ensure). Every statement must be safe to re-run: "already
+# exists" errors are ignored below.
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS email_outbox (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        idempotency_key VARCHAR(128) NOT NULL,
+        to_email VARCHAR(255) NOT NULL,
+        subject VARCHAR(255) NOT NULL,
+        body MEDIUMTEXT NOT NULL,
+        attachments LONGTEXT NULL,
+        status ENUM('pending','sending','sent','failed') NOT NULL DEFAULT 'pending',
+        attempts INT NOT NULL DEFAULT 0,
+        next_attempt_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        claimed_by VARCHAR(64) NULL,
+        claimed_at DATETIME NULL,
+        last_error VARCHAR(1000) NULL,
+        created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        sent_at DATETIME NULL,
+        UNIQUE KEY uq_email_outbox_key (idempotency_key),
+        KEY ix_email_outbox_due (status, next_attempt_at)
+    )
+    """,
+
+    # Date-windowed booking lookups (per user, and per company via the user join)
+    "ALTER TABLE conference_bookings ADD INDEX ix_bookings_user_date (user_id, booking_date, start_time)",
+    "ALTER TABLE conference_users ADD INDEX ix_conf_users_company (company)",
+
+    # One row per company-day, locked FOR UPDATE to serialize booking writes
+    """
+    CREATE TABLE IF NOT EXISTS booking_day_locks (
+        company VARCHAR(255) NOT NULL,
+        booking_date DATE NOT NULL,
+        PRIMARY KEY (company, booking_date)
+    )
+    """,
+
+    # Rooms; bookings without a room belong to the company's implicit room
+    """
+    CREATE TABLE IF NOT EXISTS conference_rooms (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        company VARCHAR(255) NOT NULL,
+        name VARCHAR(100) NOT NULL,
+        capacity INT NULL,
+        is_active TINYINT(1) NOT NULL DEFAULT 1,
+        created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE KEY uq_rooms_company_name (company, name)
+    )
+    """,
+    "ALTER TABLE conference_bookings ADD COLUMN room_id INT NULL",
+    "ALTER TABLE conference_bookings ADD INDEX ix_bookings_room_date (room_id, booking_date)",
+
+    # Auto-allocated rooms (movable by the re-optimizer) and party size
+    "ALTER TABLE conference_bookings ADD COLUMN room_auto TINYINT(1) NOT NULL DEFAULT 0",
+    "ALTER TABLE conference_bookings ADD COLUMN attendees INT NULL",
+
+    # Recurring bookings: one row per series, occurrences are expanded on read
+    """
+    CREATE TABLE IF NOT EXISTS conference_booking_series (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT NOT NULL,
+        room_id INT NULL,
+        department VARCHAR(100) NOT NULL,
+        purpose VARCHAR(100) NOT NULL,
+        freq ENUM('daily','weekly','monthly') NOT NULL,
+        interval_n INT NOT NULL DEFAULT 1,
+        start_date DATE NOT NULL,
+        until_date DATE NULL,
+        occurrence_count INT NULL,
+        last_date DATE NULL,
+        start_at TIME NOT NULL,
+        end_at TIME NOT NULL,
+        created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        KEY ix_series_user (user_id, start_date),
+        KEY ix_series_window (start_date, last_date)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS conference_booking_exceptions (
+        series_id INT NOT NULL,
+        occurrence_date DATE NOT NULL,
+        PRIMARY KEY (series_id, occurrence_date)
+    )
+    """,
+
+    # One row per company: shared by single-day writers, exclusive for series
+    """
+    CREATE TABLE IF NOT EXISTS booking_company_locks (
+        company VARCHAR(255) NOT NULL PRIMARY KEY
+    )
+    """,
+
+    # Change watermarks for incremental dashboard refresh (change_feed.py)
+    """
+    ALTER TABLE visitors ADD COLUMN updated_at DATETIME(3) NOT NULL
+        DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3)
+    """,
+    "ALTER TABLE visitors ADD INDEX ix_visitors_company_updated (company_id, updated_at)",
+    """
+    ALTER TABLE conference_bookings ADD COLUMN updated_at DATETIME(3) NOT NULL
+        DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3)
+    """,
+    "ALTER TABLE conference_bookings ADD INDEX ix_bookings_updated (updated_at)",
+    """
+    CREATE TABLE IF NOT EXISTS row_tombstones (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        table_name VARCHAR(64) NOT NULL,
+        row_id BIGINT NOT NULL,
+        company VARCHAR(255) NOT NULL,
+        deleted_at DATETIME(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+        KEY ix_tombstones_feed (table_name, company, deleted_at)
+    )
+    """,
+    "ALTER TABLE row_tombstones ADD INDEX ix_tombstones_age (deleted_at)",
+
+    # Daily visitor list / counts: one range scan per company-day
+    """
+    ALTER TABLE visitors
+        ADD INDEX ix_visitors_company_pass_reg (company_id, pass_generated, registration_timestamp)
+    """,
+
+    # Open visits for the end-of-day sweep (auto_checkout.py)
+    "ALTER TABLE visitors ADD COLUMN checkout_auto TINYINT(1) NOT NULL DEFAULT 0",
+    "ALTER TABLE visitors ADD INDEX ix_visitors_open (checkout_time, visitor_id)",
+]
+
+IGNORED_ERRORS = {
+    errorcode.ER_TABLE_EXISTS_ERROR,
+    errorcode.ER_DUP_FIELDNAME,
+    errorcode.ER_DUP_KEYNAME,
+}
+
+# Tables and columns the code reads or writes. Checked on every pool
+# creation, so a failed migration stops startup instead of surfacing later
+# as "unknown column" errors.
+REQUIRED_COLUMNS = {
+    "email_outbox": ("idempotency_key", "status", "attempts", "next_attempt_at", "claimed_by", "claimed_at"),
+    "booking_day_locks": ("company", "booking_date"),
+    "booking_company_locks": ("company",),
+    "conference_rooms": ("company", "name", "capacity", "is_active"),
+    "conference_bookings": ("room_id", "room_auto", "attendees", "updated_at"),
+    "conference_booking_series": ("room_id", "freq", "interval_n", "last_date", "start_at", "end_at"),
+    "conference_booking_exceptions": ("series_id", "occurrence_date"),
+    "row_tombstones": ("table_name", "row_id", "company", "deleted_at"),
+    "visitors": ("updated_at", "checkout_auto"),
+}
+
+# Set to 0 where migrations only run through `python schema.py`.
+AUTO_MIGRATE = os.environ.get("WHEELBRAND_AUTO_MIGRATE", "1") != "0"
+
+log = logging.getLogger(__name__)
+
+
+class SchemaError(RuntimeError):
+    """The database is missing tables or columns this code needs."""
+
+
+def apply(conn, strict=False):
+    """
+    Run every statement. Failures other than "already exists" are logged,
+    or collected and raised as SchemaError when strict.
+    """
+    failures = []
+    cur = conn.cursor()
+    try:
+        for stmt in STATEMENTS:
+            try:
+                cur.execute(stmt)
+            except Exception as e:
+                if getattr(e, "errno", None) not in IGNORED_ERRORS:
+                    log.warning("Schema statement failed: %s", e)
+                    failures.append(f"{' '.join(stmt.split())[:80]}: {e}")
+    finally:
+        cur.close()
+    if strict and failures:
+        raise SchemaError("Schema statements failed:\n" + "\n".join(failures))
+
+
+def missing_columns(conn):
+    """Required "table.column" names absent from the current database."""
+    tables = list(REQUIRED_COLUMNS)
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            SELECT TABLE_NAME, COLUMN_NAME
+            FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME IN ({", ".join(["%s"] * len(tables))})
+        """, tables)
+        present = {(t, c) for t, c in cur.fetchall()}
+    finally:
+        cur.close()
+    return [
+        f"{table}.{column}"
+        for table, columns in REQUIRED_COLUMNS.items()
+        for column in columns
+        if (table, column) not in present
+    ]
+
+
+def ensure(conn):
+    """
+    One information_schema query when the schema is current. Otherwise the
+    migration runs (if AUTO_MIGRATE) and SchemaError is raised for anything
+    still missing.
+    """
+    missing = missing_columns(conn)
+    if missing and AUTO_MIGRATE:
+        log.info("Applying schema migration for: %s", ", ".join(missing))
+        apply(conn)
+        missing = missing_columns(conn)
+    if missing:
+        raise SchemaError(
+            "Database schema is missing " + ", ".join(missing)
+            + ". Run `python schema.py` and check its errors."
+        )
+
+
+if __name__ == "__main__":
+    import mysql.connector
+
+    from db import _load_db_config
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    conn = mysql.connector.connect(**_load_db_config())
+    try:
+        apply(conn, strict=True)
+        missing = missing_columns(conn)
+    finally:
+        conn.close()
+    if missing:
+        sys.exit("Still missing: " + ", ".join(missing))
+    log.info("Schema is up to date.")
@@ -0,0 +1,88 @@
+from datetime import datetime
+
+import mysql.connector
+import pytest
+from mysql.connector import errorcode
+
+from booking_conflicts import BookingError, IntervalIndex, resolve_room, retry_deadlock
+
+
+def _at(hhmm):
+    h, m = map(int, hhmm.split(":"))
+    return datetime(2026, 1, 5, h, m)
+
+
+def _row(bid, start, end):
+    return {"id": bid, "start_time": _at(start), "end_time": _at(end)}
+
+
+def test_back_to_back_is_free():
+    index = IntervalIndex([_row(1, "09:00", "10:00")])
+    assert index.find_overlap(_at("10:00"), _at("11:00")) is None
+
+
+def test_overlap_found():
+    index = IntervalIndex([_row(1, "09:00", "10:00")])
+    assert index.find_overlap(_at("09:30"), _at("11:00"))["id"] == 1
+
+
+def test_overlap_behind_a_nested_legacy_booking():
+    # Legacy rows can overlap; the nearest earlier start ends before the query
+    index = IntervalIndex([_row(1, "09:00", "12:00"), _row(2, "10:00", "10:30")])
+    assert index.find_overlap(_at("11:00"), _at("11:30"))["id"] == 1
+
+
+def test_overlap_after_add():
+    index = IntervalIndex([_row(2, "10:00", "10:30")])
+    index.add(_row(1, "09:00", "12:00"))
+    assert index.find_overlap(_at("11:00"), _at("11:30"))["id"] == 1
+
+
+def test_ignore_id():
+    index = IntervalIndex([_row(1, "09:00", "12:00"), _row(2, "10:00", "10:30")])
+    assert index.find_overlap(_at("11:00"), _at("11:30"), ignore_id=1) is None
+    assert index.find_overlap(_at("10:00"), _at("11:30"), ignore_id=1)["id"] == 2
+
+
+def _deadlock():
+    return mysql.connector.DatabaseError(msg="Deadlock found", errno=errorcode.ER_LOCK_DEADLOCK)
+
+
+def test_deadlock_retried_once():
+    calls = []
+
+    @retry_deadlock
+    def book():
+        calls.append(1)
+        if len(calls) == 1:
+            raise _deadlock()
+        return 42
+
+    assert book() == 42
+    assert len(calls) == 2
+
+
+def test_repeated_deadlock_becomes_booking_error():
+    @retry_deadlock
+    def book():
+        raise _deadlock()
+
+    with pytest.raises(BookingError):
+        book()
+
+
+class _RoomCursor:
+    def __init__(self, first_room):
+        self.first_room = first_room
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchone(self):
+        return {"id": self.first_room}
+
+
+def test_implicit_room_resolves_to_first_room_once_rooms_exist():
+    assert resolve_room(_RoomCursor(4), "acme", None) == 4
+    assert resolve_room(_RoomCursor(None), "acme", None) is None
+    assert resolve_room(_RoomCursor(4), "acme", 9) == 9
@@ -0,0 +1,57 @@
+from contextlib import contextmanager
+from datetime import date, time
+
+import pytest
+
+import booking_recurrence
+
+TODAY = date(2026, 3, 10)
+
+
+class _Cursor:
+    def __init__(self, series):
+        self.series = series
+        self.writes = []
+        self._result = None
+
+    def execute(self, query, params=None):
+        if "FOR UPDATE" in query:
+            self._result = [self.series]
+        elif query.lstrip().startswith("SELECT"):
+            self._result = []
+        else:
+            self.writes.append((query.split()[0], params))
+
+    def fetchone(self):
+        return self._result[0]
+
+    def fetchall(self):
+        return self._result
+
+
+@pytest.fixture
+def cursor_for(monkeypatch):
+    def make(start_date):
+        cur = _Cursor({
+            "id": 7, "freq": "weekly", "interval_n": 1, "start_date": start_date,
+            "until_date": None, "occurrence_count": 10, "start_at": time(10), "end_at": time(11),
+        })
+
+        @contextmanager
+        def transaction(dictionary=False):
+            yield cur
+        monkeypatch.setattr(booking_recurrence.db, "transaction", transaction)
+        return cur
+    return make
+
+
+def test_series_with_history_is_ended_not_deleted(cursor_for):
+    cur = cursor_for(date(2026, 2, 24))
+    booking_recurrence.end_series(7, 1, TODAY)
+    assert cur.writes == [("UPDATE", (date(2026, 3, 3), date(2026, 3, 3), 7))]
+
+
+def test_series_not_started_is_deleted(cursor_for):
+    cur = cursor_for(TODAY)
+    booking_recurrence.end_series(7, 1, TODAY)
+    assert [w[0] for w in cur.writes] == ["DELETE", "DELETE"]
@@ -0,0 +1,17 @@
+import change_feed
+
+
+def test_tombstones_pruned_once_per_resync_interval(monkeypatch):
+    deletes = []
+    monkeypatch.setattr(change_feed.db, "execute", lambda q, p=None: deletes.append(p))
+    monkeypatch.setattr(change_feed, "_pruned_at", 0.0)
+    clock = [10_000.0]
+    monkeypatch.setattr(change_feed.time, "monotonic", lambda: clock[0])
+
+    change_feed.prune_tombstones()
+    change_feed.prune_tombstones()
+    clock[0] += change_feed.RESYNC_INTERVAL
+    change_feed.prune_tombstones()
+
+    assert deletes == [(int(change_feed.TOMBSTONE_TTL),)] * 2
+    assert change_feed.TOMBSTONE_TTL > change_feed.RESYNC_INTERVAL
@@ -0,0 +1,68 @@
+from datetime import date, datetime, timedelta
+
+from streamlit.testing.v1 import AppTest
+
+import conference_booking
+
+ROOMS = [{"id": 1, "name": "Boardroom"}, {"id": 2, "name": "Huddle"}]
+
+
+def _booking(bid, room_id):
+    return {
+        "id": bid, "room_id": room_id, "purpose": "Sync",
+        "start_time": datetime(2026, 1, 5, 10, 0), "end_time": datetime(2026, 1, 5, 11, 0),
+    }
+
+
+def test_unlicensed_company_views_use_free_views(monkeypatch):
+    monkeypatch.setattr(conference_booking, "scheduler_license_key", lambda: None)
+    week = conference_booking.calendar_options("Company Week", date(2026, 1, 5), ROOMS)
+    month = conference_booking.calendar_options("Company Month", date(2026, 1, 5), ROOMS)
+    assert week["initialView"] == "timeGridWeek"
+    assert month["initialView"] == "dayGridMonth"
+    assert "schedulerLicenseKey" not in week and "resources" not in week
+
+
+def test_licensed_company_view_uses_room_lanes(monkeypatch):
+    monkeypatch.setattr(conference_booking, "scheduler_license_key", lambda: "0000-purchased")
+    week = conference_booking.calendar_options("Company Week", date(2026, 1, 5), ROOMS)
+    assert week["initialView"] == "resourceTimelineWeek"
+    assert week["schedulerLicenseKey"] == "0000-purchased"
+    assert [r["title"] for r in week["resources"]] == ["Boardroom", "Huddle"]
+
+
+def test_room_shown_in_title_and_colour_without_lanes():
+    a, b = conference_booking.prepare_events([_booking(1, 1), _booking(2, 2)], ROOMS, room_titles=True)
+    assert a["title"].startswith("Boardroom · ")
+    assert b["title"].startswith("Huddle · ")
+    assert a["color"] != b["color"]
+
+
+def _history_app():
+    import conference_booking
+    conference_booking.render_booking_history(1, {}, False)
+
+
+def test_history_pages_with_the_last_row_as_cursor(monkeypatch):
+    rows = [
+        {"id": i, "room_id": 1, "booking_date": date(2026, 1, 1) + timedelta(days=i),
+         "start_time": datetime(2026, 1, 1, 10) + timedelta(days=i),
+         "end_time": datetime(2026, 1, 1, 11) + timedelta(days=i),
+         "purpose": "Sync", "department": "Ops"}
+        for i in range(30, 0, -1)
+    ]
+    calls = []
+
+    def history(uid, limit=50, before=None):
+        calls.append(before)
+        older = [r for r in rows if before is None or r["id"] < before["id"]]
+        return older[:limit]
+    monkeypatch.setattr(conference_booking, "get_my_booking_history", history)
+
+    at = AppTest.from_function(_history_app).run()
+    assert len(at.markdown) == conference_booking.HISTORY_PAGE_SIZE
+    at.button(key="history_older").click().run()
+    assert calls[-1]["id"] == 30 - conference_booking.HISTORY_PAGE_SIZE + 1
+    assert len(at.markdown) == 30 - conference_booking.HISTORY_PAGE_SIZE
+    at.button(key="history_newer").click().run()
+    assert calls[-1] is None
@@ -0,0 +1,54 @@
+import mysql.connector
+import pytest
+from mysql.connector import errorcode
+
+import db
+
+
+class _Conn:
+    def __init__(self, password):
+        self.password = password
+
+    def ping(self, **kwargs):
+        if self.password == "old":
+            err = mysql.connector.DatabaseError(msg="Access denied", errno=errorcode.ER_ACCESS_DENIED_ERROR)
+            raise mysql.connector.InterfaceError("Can not reconnect") from err
+
+    def close(self):
+        pass
+
+
+class _Pool:
+    def __init__(self, **config):
+        self.password = config["password"]
+
+    def get_connection(self):
+        return _Conn(self.password)
+
+
+@pytest.fixture
+def secret(monkeypatch):
+    current = {"DB_HOST": "h", "DB_USER": "u", "DB_PASSWORD": "old", "DB_NAME": "n"}
+    monkeypatch.setattr(db, "get_credentials", lambda: current)
+    monkeypatch.setattr(db.pooling, "MySQLConnectionPool", _Pool)
+    monkeypatch.setattr(db.schema, "ensure", lambda conn: None)
+    monkeypatch.setattr(db, "_pool", None)
+    monkeypatch.setattr(db, "_pool_config", None)
+    return current
+
+
+def test_pool_rebuilt_when_the_secret_changes(secret):
+    first = db.get_pool()
+    assert db.get_pool() is first
+    secret["DB_PASSWORD"] = "new"
+    assert db.get_pool().password == "new"
+
+
+def test_access_denied_refetches_the_secret(secret, monkeypatch):
+    def refresh():
+        secret["DB_PASSWORD"] = "new"
+        return secret
+    monkeypatch.setattr(db, "refresh_credentials", refresh)
+
+    with db.get_connection() as conn:
+        assert conn.password == "new"
@@ -0,0 +1,13 @@
+import email_outbox
+
+
+def test_identical_message_merges_within_the_window():
+    t = 1_000_000 * email_outbox.CONTENT_DEDUP_WINDOW
+    assert email_outbox.make_key("a@x", "Hi", "Body", now=t) == \
+        email_outbox.make_key("a@x", "Hi", "Body", now=t + 5)
+
+
+def test_identical_message_sent_again_later_gets_a_new_key():
+    t = 1_000_000 * email_outbox.CONTENT_DEDUP_WINDOW
+    assert email_outbox.make_key("a@x", "Hi", "Body", now=t) != \
+        email_outbox.make_key("a@x", "Hi", "Body", now=t + email_outbox.CONTENT_DEDUP_WINDOW)
@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+import occupancy
+
+
+def test_seed_is_bounded_to_today(monkeypatch):
+    calls = []
+    monkeypatch.setattr(occupancy.db, "fetch_all", lambda q, p=None: calls.append(p) or [])
+    registry = occupancy.OccupancyRegistry()
+
+    assert registry.count(1) == 0
+    assert calls == [occupancy.ist_day_range(occupancy.ist_today())]
+
+
+def test_check_in_ignores_earlier_days(monkeypatch):
+    monkeypatch.setattr(occupancy.db, "fetch_all", lambda q, p=None: [])
+    registry = occupancy.OccupancyRegistry()
+    registry.count(1)
+
+    start, _ = occupancy.ist_day_range(occupancy.ist_today())
+    registry.check_in({"visitor_id": 1, "company_id": 1, "registration_timestamp": start})
+    registry.check_in({"visitor_id": 2, "company_id": 1,
+                       "registration_timestamp": start - timedelta(minutes=1)})
+    assert [v["visitor_id"] for v in registry.inside(1)] == [1]
+
+
+def test_reseeds_when_the_day_changes(monkeypatch):
+    calls = []
+    monkeypatch.setattr(occupancy.db, "fetch_all", lambda q, p=None: calls.append(p) or [])
+    registry = occupancy.OccupancyRegistry()
+    registry.count(1)
+
+    tomorrow = occupancy.ist_today() + timedelta(days=1)
+    monkeypatch.setattr(occupancy, "ist_today", lambda: tomorrow)
+    registry.count(1)
+    assert calls[-1] == occupancy.ist_day_range(tomorrow)
+
+
+def test_roll_call_embeds_the_thumbnail():
+    row = {"full_name": "Ada", "phone_number": "", "from_company": "", "person_to_meet": "",
+           "registration_timestamp": None, "photo_url": "file:///photos/1.jpg", "thumbnail": b"\xff\xd8"}
+    page = occupancy.evacuation_html({"Acme": [row]})
+    assert 'src="data:image/jpeg;base64,/9g="' in page
+    assert "file://" not in occupancy.evacuation_html({"Acme": [dict(row, thumbnail=None)]})
@@ -0,0 +1,20 @@
+import room_availability
+
+
+def test_rooms_adopt_implicit_bookings_once(monkeypatch):
+    rooms = [{"id": 7, "name": "B", "capacity": 4}, {"id": 3, "name": "A", "capacity": 8}]
+    adopted, changed = [], []
+    monkeypatch.setattr(room_availability.db, "fetch_all", lambda q, p=None: [dict(r) for r in rooms])
+    monkeypatch.setattr(room_availability, "adopt_implicit_bookings",
+                        lambda company, room_id: adopted.append((company, room_id)) or 2)
+    monkeypatch.setattr(room_availability, "_adopted", set())
+
+    assert room_availability.get_company_rooms("acme", on_adopt=changed.append) == rooms
+    room_availability.get_company_rooms("acme", on_adopt=changed.append)
+    assert adopted == [("acme", 3)]
+    assert changed == ["acme"]
+
+
+def test_no_rooms_keeps_the_implicit_room(monkeypatch):
+    monkeypatch.setattr(room_availability.db, "fetch_all", lambda q, p=None: [])
+    assert room_availability.get_company_rooms("acme") == [room_availability.DEFAULT_ROOM]
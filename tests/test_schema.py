@@ -0,0 +1,58 @@
+import pytest
+
+import schema
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    def execute(self, query, params=None):
+        if "information_schema" in query:
+            self.rows = sorted(self.db.columns)
+        else:
+            self.db.executed.append(query)
+            if self.db.fail_ddl:
+                raise RuntimeError("ALTER command denied")
+            self.db.columns |= self.db.created
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, columns, fail_ddl=False):
+        self.columns = set(columns)
+        self.created = {(t, c) for t, cols in schema.REQUIRED_COLUMNS.items() for c in cols}
+        self.fail_ddl = fail_ddl
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+def test_current_schema_runs_no_ddl():
+    conn = FakeConnection({(t, c) for t, cols in schema.REQUIRED_COLUMNS.items() for c in cols})
+    schema.ensure(conn)
+    assert conn.executed == []
+
+
+def test_missing_columns_are_migrated():
+    conn = FakeConnection(set())
+    schema.ensure(conn)
+    assert len(conn.executed) == len(schema.STATEMENTS)
+
+
+def test_failed_migration_raises():
+    conn = FakeConnection(set(), fail_ddl=True)
+    with pytest.raises(schema.SchemaError, match="visitors.checkout_auto"):
+        schema.ensure(conn)
+
+
+def test_strict_apply_raises():
+    with pytest.raises(schema.SchemaError):
+        schema.apply(FakeConnection(set(), fail_ddl=True), strict=True)
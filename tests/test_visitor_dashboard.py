@@ -0,0 +1,79 @@
+from datetime import datetime
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import visitor_dashboard
+from occupancy import registry as occupancy
+
+
+def _visitor(visitor_id, checked_out=False):
+    return {
+        "visitor_id": visitor_id,
+        "full_name": f"Visitor {visitor_id}",
+        "phone_number": "9999999999",
+        "email": f"v{visitor_id}@example.com",
+        "from_company": "Globex",
+        "person_to_meet": "Reception",
+        "registration_timestamp": datetime(2026, 1, 1, 4, 30),
+        "checkout_time": datetime(2026, 1, 1, 6, 0) if checked_out else None,
+    }
+
+
+def _app():
+    import visitor_dashboard
+    visitor_dashboard.render_dashboard()
+
+
+@pytest.fixture
+def dashboard(monkeypatch):
+    rows = [_visitor(2), _visitor(1, checked_out=True)]
+    checkouts = []
+
+    monkeypatch.setattr(visitor_dashboard, "dashboard_counts", lambda company_id: (2, 1, 1))
+    monkeypatch.setattr(visitor_dashboard, "get_visitors_page",
+                        lambda company_id, page: ([dict(r) for r in rows], len(rows)))
+    monkeypatch.setattr(visitor_dashboard, "checkout_many",
+                        lambda ids, company_id: checkouts.append(list(ids)))
+    monkeypatch.setattr(occupancy, "count", lambda company_id: 1)
+    monkeypatch.setattr(occupancy, "inside", lambda company_id: [rows[0]])
+
+    at = AppTest.from_function(_app)
+    at.session_state["admin_logged_in"] = True
+    at.session_state["company_id"] = 7
+    at.session_state["company_name"] = "Acme"
+    return at, rows, checkouts
+
+
+def test_dashboard_renders(dashboard):
+    at, _, _ = dashboard
+    at.run()
+    assert not at.exception
+    assert any("Visitor List" in m.value for m in at.markdown)
+
+
+def _table_key(at):
+    return at.dataframe[0].key
+
+
+def test_checkout_resolves_selection_by_visitor_id(dashboard):
+    at, rows, checkouts = dashboard
+    at.run()
+    key = _table_key(at)
+
+    # Selected the first row, then a new arrival is listed above it
+    at.session_state[key] = {"selection": {"rows": [0], "columns": [], "cells": []}}
+    rows.insert(0, _visitor(3))
+    at.run()
+    assert not at.exception
+    assert not [b for b in at.button if b.label.startswith("Checkout")]
+
+    key = _table_key(at)
+    selection = {"selection": {"rows": [1], "columns": [], "cells": []}}
+    at.session_state[key] = selection
+    at.run()
+    button = next(b for b in at.button if b.label == "Checkout Visitor 2")
+    at.session_state[key] = selection   # the browser re-sends it with the click
+    button.click().run()
+    assert checkouts == [[2]]
+    assert _table_key(at) != key
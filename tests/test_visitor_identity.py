@@ -0,0 +1,97 @@
+import threading
+import time
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+import occupancy
+import visitor_identity
+from photo_ingest import ingest_photo
+from photo_storage import MemoryStorage, set_storage
+
+VISITOR = {
+    "visitor_id": 5, "company_id": 1, "full_name": "Ada Lovelace",
+    "from_company": "Analytical", "person_to_meet": "Reception", "email": "ada@example.com",
+}
+
+
+@pytest.fixture
+def photo():
+    out = BytesIO()
+    Image.new("RGB", (640, 480), "red").save(out, format="JPEG")
+    return ingest_photo(out.getvalue())
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    set_storage(MemoryStorage())
+    calls = {"record": [], "email": []}
+
+    def record(visitor, url, company_name=None, thumbnail=None):
+        time.sleep(0.05)
+        calls["record"].append(url)
+
+    monkeypatch.setattr(visitor_identity, "record_pass", record)
+    monkeypatch.setattr(visitor_identity, "send_email",
+                        lambda visitor, image: calls["email"].append(image) or (True, None))
+    yield calls
+    set_storage(None)
+
+
+def _settle(status):
+    deadline = time.monotonic() + 5
+    while any(s in ("pending", "running") for s in status.values()):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_pass_rendered_in_calling_thread(stages, photo, monkeypatch):
+    render = visitor_identity.generate_pass_image
+    seen = []
+    monkeypatch.setattr(visitor_identity, "generate_pass_image",
+                        lambda v, p: seen.append(threading.current_thread()) or render(v, p))
+
+    image, status = visitor_identity.finalize_pass(VISITOR, photo)
+    assert image[:2] == b"\xff\xd8"
+    assert seen == [threading.current_thread()]
+
+    _settle(status)
+    assert set(status.values()) == {"done"}
+    assert stages["email"] == [image]
+
+
+def test_render_failure_reports_check_in(stages, photo, monkeypatch):
+    def broken(visitor, photo):
+        raise OSError("font missing")
+    monkeypatch.setattr(visitor_identity, "generate_pass_image", broken)
+
+    image, status = visitor_identity.finalize_pass(VISITOR, photo)
+    assert image is None
+    assert status["database"] == "done"
+    assert status["pass"].startswith("failed")
+    assert status["email"].startswith("failed")
+    assert stages["email"] == []
+
+
+class _BrokenStorage(MemoryStorage):
+    def put(self, key, data, content_type="image/jpeg"):
+        raise OSError("bucket unreachable")
+
+
+def test_failed_upload_clears_the_photo_url(stages, photo, monkeypatch):
+    monkeypatch.setattr(visitor_identity.db, "execute", lambda q, p=None: None)
+    monkeypatch.setattr(occupancy.db, "fetch_all", lambda q, p=None: [])
+    registry = occupancy.OccupancyRegistry()
+    registry.count(VISITOR["company_id"])
+    monkeypatch.setattr(visitor_identity, "occupancy", registry)
+
+    def record(visitor, url, company_name=None, thumbnail=None):
+        registry.check_in(visitor, url, company_name, thumbnail)
+    monkeypatch.setattr(visitor_identity, "record_pass", record)
+    set_storage(_BrokenStorage())
+
+    _, status = visitor_identity.finalize_pass(VISITOR, photo)
+    _settle(status)
+    assert status["upload"].startswith("failed")
+    assert [v["photo_url"] for v in registry.inside(VISITOR["company_id"])] == [None]
@@ -1,49 +1,34 @@
 import streamlit as st
-import mysql.connector
-from datetime import datetime
-import boto3
-import json
-
-# Try to use zoneinfo (Python 3.9+). Fallback gracefully if not available.
-try:
-    from zoneinfo import ZoneInfo
-    ZONE_IST = ZoneInfo("Asia/Kolkata")
-except Exception:
-    ZoneInfo = None
-    ZONE_IST = None
+import pandas as pd
+import hashlib
+from datetime import datetime, timedelta
+
+import auto_checkout
+import db
+import read_cache
+from change_feed import get_snapshot
+from ist_time import ZONE_IST, ist_day_range, ist_today
+from occupancy import evacuation_html, registry as occupancy
 
 # ====================================================
 # CONFIG
 # ====================================================
-AWS_REGION = "ap-south-1"
-AWS_SECRET = "arn:aws:secretsmanager:ap-south-1:034362058776:secret:Wheelbrand-zM6npS"
 LOGO_URL = "https://raw.githubusercontent.com/ZODOPT-Tech/Wheelbrand/main/images/zodopt.png"
 HEADER_GRADIENT = "linear-gradient(90deg, #4B2ECF, #7A42FF)"
 
+# Visitors checked out today may have registered up to this long before
+# midnight; the counts scan reaches back this far.
+CHECKOUT_LOOKBACK = timedelta(days=1)
 
-# ====================================================
-# AWS SECRETS
-# ====================================================
-@st.cache_resource
-def get_credentials():
-    client = boto3.client("secretsmanager", region_name=AWS_REGION)
-    raw = client.get_secret_value(SecretId=AWS_SECRET)
-    return json.loads(raw["SecretString"])
+PAGE_SIZE = 50
 
-
-# ====================================================
-# DB CONNECTION
-# ====================================================
-@st.cache_resource
-def get_conn():
-    c = get_credentials()
-    return mysql.connector.connect(
-        host=c["DB_HOST"],
-        user=c["DB_USER"],
-        password=c["DB_PASSWORD"],
-        database=c["DB_NAME"],
-        autocommit=True
-    )
+VISITOR_COLUMNS = {
+    "full_name": "Name",
+    "phone_number": "Phone",
+    "person_to_meet": "Meeting",
+    "registration_timestamp": "Visited",
+    "checkout_time": "Checkout",
+}
 
 
 # ====================================================
@@ -96,6 +81,18 @@ def format_dt(dt):
             return "—"
 
 
+def format_dt_column(df, columns):
+    """
+    format_dt for whole DataFrame columns: naive values are UTC, shown in
+    IST as 'DD-MM-YYYY HH:MM', missing ones as "—". All columns are parsed
+    and converted together in one vectorized pass.
+    """
+    flat = pd.to_datetime(pd.Series(df[columns].to_numpy().ravel()), utc=True)
+    text = flat.dt.tz_convert("Asia/Kolkata").dt.strftime("%d-%m-%Y %H:%M").fillna("—")
+    df[columns] = text.to_numpy().reshape(len(df), len(columns))
+    return df
+
+
 # ====================================================
 # CSS
 # ====================================================
@@ -152,81 +149,96 @@ def inject_css():
 # ====================================================
 # DATA FETCHING
 # ====================================================
+def _visitors_feed(company_id, day):
+    start, end = ist_day_range(day)
+
+    def fetch(since):
+        if since is None:
+            return db.fetch_all("""
+                SELECT visitor_id, full_name, phone_number, person_to_meet,
+                       registration_timestamp, checkout_time, updated_at
+                FROM visitors
+                WHERE company_id=%s
+                  AND pass_generated=1
+                  AND registration_timestamp >= %s
+                  AND registration_timestamp < %s
+            """, (company_id, start, end), coalesce=True)
+
+        return db.fetch_all("""
+            SELECT visitor_id, full_name, phone_number, person_to_meet,
+                   registration_timestamp, checkout_time, updated_at,
+                   (pass_generated=1
+                    AND registration_timestamp >= %s
+                    AND registration_timestamp < %s) AS in_window
+            FROM visitors
+            WHERE company_id=%s
+              AND updated_at > %s
+        """, (start, end, company_id, since), coalesce=True)
+    return fetch
+
+
+@read_cache.cached("visitors")
 def get_visitors(company_id):
-    conn = get_conn()
-    cur = conn.cursor(dictionary=True)
-    cur.execute("""
-        SELECT visitor_id, full_name, phone_number, person_to_meet,
-               registration_timestamp, checkout_time
-        FROM visitors
-        WHERE company_id=%s
-          AND pass_generated=1
-          AND DATE(registration_timestamp)=CURDATE()
-        ORDER BY registration_timestamp DESC
-    """, (company_id,))
-    rows = cur.fetchall()
-    cur.close()
+    # Today's (IST) visitors from a shared snapshot; each call only reads the
+    # rows changed since the last one (ix_visitors_company_updated).
+    day = ist_today()
+    snap = get_snapshot(("visitors", company_id, day), "visitor_id", _visitors_feed(company_id, day))
+    rows = snap.rows()
+    rows.sort(key=lambda v: v["registration_timestamp"], reverse=True)
     return rows
 
 
-def dashboard_counts(company_id):
-    conn = get_conn()
-    cur = conn.cursor(dictionary=True)
+def get_visitors_page(company_id, page, page_size=PAGE_SIZE):
+    """
+    One page of today's visitors (newest first) and the total count. Only
+    the page goes to the browser, however many visitors the day has.
+    """
+    rows = get_visitors(company_id)
+    return rows[page * page_size:(page + 1) * page_size], len(rows)
 
-    cur.execute("""
-        SELECT COUNT(*) AS c
-        FROM visitors
-        WHERE company_id=%s
-          AND pass_generated=1
-          AND DATE(registration_timestamp)=CURDATE()
-    """, (company_id,))
-    total = cur.fetchone()['c']
 
-    cur.execute("""
-        SELECT COUNT(*) AS c
+@read_cache.cached("visitors")
+def dashboard_counts(company_id):
+    """
+    (visitors today, currently inside, checked out today) in one range scan
+    of ix_visitors_company_pass_reg.
+    """
+    start, end = ist_day_range(ist_today())
+    row = db.fetch_one("""
+        SELECT
+            SUM(registration_timestamp >= %s) AS total,
+            SUM(registration_timestamp >= %s AND checkout_time IS NULL) AS inside,
+            SUM(checkout_time >= %s AND checkout_time < %s) AS checked_out
         FROM visitors
         WHERE company_id=%s
           AND pass_generated=1
-          AND checkout_time IS NULL
-          AND DATE(registration_timestamp)=CURDATE()
-    """, (company_id,))
-    inside = cur.fetchone()['c']
-
-    cur.execute("""
-        SELECT COUNT(*) AS c
-        FROM visitors
+          AND registration_timestamp >= %s
+          AND registration_timestamp < %s
+    """, (start, start, start, end, company_id, start - CHECKOUT_LOOKBACK, end), coalesce=True)
+
+    return int(row["total"] or 0), int(row["inside"] or 0), int(row["checked_out"] or 0)
+
+
+def checkout_many(visitor_ids, company_id):
+    """Check out several visitors of the company in one statement."""
+    if not visitor_ids:
+        return 0
+    marks = ", ".join(["%s"] * len(visitor_ids))
+    # Same clock as registration_timestamp (NOW()), so day ranges apply to both
+    _, closed = db.execute(f"""
+        UPDATE visitors
+        SET checkout_time=NOW()
         WHERE company_id=%s
-          AND pass_generated=1
-          AND DATE(checkout_time)=CURDATE()
-    """, (company_id,))
-    out = cur.fetchone()['c']
-
-    cur.close()
-    return total, inside, out
+          AND checkout_time IS NULL
+          AND visitor_id IN ({marks})
+    """, (company_id, *visitor_ids))
+    read_cache.invalidate("visitors", company_id)
+    occupancy.check_out(company_id, visitor_ids)
+    return closed
 
 
-def checkout(visitor_id):
-    conn = get_conn()
-    cur = conn.cursor()
-    # Use Asia/Kolkata now for checkout timestamp
-    try:
-        if ZONE_IST is not None:
-            now = datetime.now(tz=ZONE_IST)
-        else:
-            now = datetime.now()
-        cur.execute("""
-            UPDATE visitors 
-            SET checkout_time=%s 
-            WHERE visitor_id=%s
-        """, (now, visitor_id))
-        cur.close()
-    except Exception:
-        # Ensure cursor closed on error
-        try:
-            cur.close()
-        except:
-            pass
-        raise
+def checkout(visitor_id, company_id):
+    return checkout_many([visitor_id], company_id)
 
 
 # ====================================================
@@ -242,6 +254,7 @@ def render_dashboard():
         st.stop()
 
     inject_css()
+    auto_checkout.start_background_scheduler()
 
     company = st.session_state.get("company_name", "Your Company")
     company_id = st.session_state.get("company_id")
@@ -256,6 +269,14 @@ def render_dashboard():
         </div>
     """, unsafe_allow_html=True)
 
+    # Summary, visitor page and occupancy are independent: fetch together
+    page = st.session_state.get("visitor_page", 0)
+    (total, _, out), (data, total_rows), inside = db.fetch_parallel(
+        lambda: dashboard_counts(company_id),
+        lambda: get_visitors_page(company_id, page),
+        lambda: occupancy.count(company_id),
+    )
+
     # MAIN LAYOUT
     left, right = st.columns([4, 1.5])
 
@@ -265,7 +286,6 @@ def render_dashboard():
     with right:
 
         st.markdown("### 📊 Summary")
-        total, inside, out = dashboard_counts(company_id)
 
         for label, val in [
             ("Visitors Today", total),
@@ -279,6 +299,20 @@ def render_dashboard():
                 </div>
             """, unsafe_allow_html=True)
 
+        # -----------------------------------------
+        # EVACUATION ROLL-CALL
+        # -----------------------------------------
+        with st.expander("🚨 Evacuation List"):
+            people = occupancy.inside(company_id)
+            roll_call = evacuation_html({company: people})
+            st.download_button(
+                "Download printable list", roll_call,
+                file_name=f"evacuation_{datetime.now().strftime('%Y%m%d_%H%M')}.html",
+                mime="text/html", use_container_width=True,
+            )
+            for v in people:
+                st.write(f"**{v['full_name']}** · {v['phone_number']} · meeting {v['person_to_meet']}")
+
     # -----------------------------------------
     # LEFT CONTENT
     # -----------------------------------------
@@ -294,40 +328,55 @@ def render_dashboard():
 
         st.markdown("## Visitor List")
 
-        data = get_visitors(company_id)
+        pages = max((total_rows - 1) // PAGE_SIZE + 1, 1)
+        if page >= pages:
+            page = st.session_state["visitor_page"] = 0
+            data, total_rows = get_visitors_page(company_id, page)
 
         if not data:
             st.info("No visitors today.")
             return
 
-        header = st.columns([3, 2, 2, 3, 2, 2])
-        header[0].markdown("### Name")
-        header[1].markdown("### Phone")
-        header[2].markdown("### Meeting")
-        header[3].markdown("### Visited")
-        header[4].markdown("### Checkout")
-        header[5].markdown("### Action")
-
-        st.markdown("---")
-
-        for v in data:
-            vid = v["visitor_id"]
-
-            # Format times to Asia/Kolkata
-            reg_ts = format_dt(v.get("registration_timestamp"))
-            checkout_time_str = format_dt(v.get("checkout_time"))
-
-            row = st.columns([3, 2, 2, 3, 2, 2])
-            row[0].write(v["full_name"])
-            row[1].write(v["phone_number"])
-            row[2].write(v["person_to_meet"])
-            row[3].write(reg_ts)
-            row[4].write(checkout_time_str)
-
-            with row[5]:
-                if not v["checkout_time"]:
-                    if st.button("Checkout", key=f"out_{vid}"):
-                        checkout(vid)
-                        st.rerun()
-                else:
-                    st.markdown("<div class='summary-title'>Done</div>", unsafe_allow_html=True)
+        df = pd.DataFrame(data, columns=["visitor_id", *VISITOR_COLUMNS])
+        df = format_dt_column(df, ["registration_timestamp", "checkout_time"])
+        df = df.rename(columns=VISITOR_COLUMNS).set_index("visitor_id")
+
+        # One widget for the whole page; select rows to check them out.
+        # Selections are row positions, so the key changes with the list of
+        # visitor ids shown: if the list changes between reruns the
+        # selection resets instead of landing on other visitors.
+        shown = hashlib.sha1(",".join(map(str, df.index)).encode()).hexdigest()[:12]
+        selection_gen = st.session_state.get("visitor_selection_gen", 0)
+        event = st.dataframe(
+            df,
+            use_container_width=True,
+            hide_index=True,
+            on_select="rerun",
+            selection_mode="multi-row",
+            key=f"visitors_{page}_{selection_gen}_{shown}",
+        )
+
+        by_id = {v["visitor_id"]: v for v in data}
+        selected = [by_id[vid] for vid in df.index[event.selection.rows]]
+        inside = [v for v in selected if not v["checkout_time"]]
+        if selected and not inside:
+            st.caption("The selected visitors have already checked out.")
+        elif inside:
+            label = inside[0]["full_name"] if len(inside) == 1 else f"{len(inside)} visitors"
+            if st.button(f"Checkout {label}", type="primary"):
+                checkout_many([v["visitor_id"] for v in inside], company_id)
+                st.session_state["visitor_selection_gen"] = selection_gen + 1
+                st.rerun()
+
+        if pages > 1:
+            p1, p2, p3 = st.columns([1, 2, 1])
+            with p1:
+                if st.button("◀ Newer", disabled=page == 0, use_container_width=True):
+                    st.session_state["visitor_page"] = page - 1
+                    st.rerun()
+            with p2:
+                st.caption(f"Page {page + 1} of {pages} · {total_rows} visitors")
+            with p3:
+                if st.button("Older ▶", disabled=page >= pages - 1, use_container_width=True):
+                    st.session_state["visitor_page"] = page + 1
+                    st.rerun()
@@ -1,40 +1,8 @@
 import streamlit as st
 from datetime import datetime
-import json
-import mysql.connector
-from mysql.connector import Error
-import boto3
-from botocore.exceptions import ClientError
-
-# ============================== AWS + DB ==============================
-AWS_REGION = "ap-south-1"
-AWS_SECRET_NAME = "arn:aws:secretsmanager:ap-south-1:034362058776:secret:Wheelbrand-zM6npS"
-DEFAULT_DB_PORT = 3306
-
-
-@st.cache_resource(ttl=3600)
-def get_db_credentials():
-    try:
-        client = boto3.client("secretsmanager", region_name=AWS_REGION)
-        resp = client.get_secret_value(SecretId=AWS_SECRET_NAME)
-        return json.loads(resp["SecretString"])
-    except Exception as e:
-        st.error(f"Error fetching DB credentials: {e}")
-        st.stop()
-
-
-@st.cache_resource
-def get_fast_connection():
-        creds = get_db_credentials()
-        return mysql.connector.connect(
-            host=creds["DB_HOST"],
-            user=creds["DB_USER"],
-            password=creds["DB_PASSWORD"],
-            database=creds["DB_NAME"],
-            port=DEFAULT_DB_PORT,
-            autocommit=True,
-            connection_timeout=10,
-        )
+
+import db
+import read_cache
 
 
 # ============================== DB INSERT ==============================
@@ -43,9 +11,6 @@ def save_visitor_and_get_id(visitor):
     Insert the visitor into 'visitors' table and return visitor_id.
     Automatically adds company_id and status='pending'
     """
-    conn = get_fast_connection()
-    cursor = conn.cursor()
-
     visitor["company_id"] = st.session_state["company_id"]
 
     query = """
@@ -73,9 +38,8 @@ def save_visitor_and_get_id(visitor):
         )
     """
 
-    cursor.execute(query, visitor)
-    visitor_id = cursor.lastrowid
-    cursor.close()
+    visitor_id, _ = db.execute(query, visitor)
+    read_cache.invalidate("visitors", visitor["company_id"])
     return visitor_id
 
 
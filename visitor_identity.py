@@ -1,158 +1,98 @@
 import streamlit as st
-import mysql.connector
-import boto3
-import json
 import base64
 import logging
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
-from email.mime.text import MIMEText
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait as futures_wait
 from datetime import datetime
-from io import BytesIO
-from PIL import Image, ImageDraw, ImageFont
-import requests
 
-
-# ========================
-# CONFIG
-# ========================
-AWS_REGION = "ap-south-1"
-AWS_SECRET_ARN = "arn:aws:secretsmanager:ap-south-1:034362058776:secret:Wheelbrand-zM6npS"
-S3_BUCKET = "zodoptvisiorsmanagement"
-LOGO_URL = "https://raw.githubusercontent.com/ZODOPT-Tech/Wheelbrand/main/images/zodopt.png"
+import db
+import mailer
+import photo_storage
+import read_cache
+from occupancy import registry as occupancy
+from pass_renderer import render_pass
+from photo_ingest import ingest_photo
 
 
-# ========================
-# SECRETS MANAGER
-# ========================
-@st.cache_resource
-def get_credentials():
-    client = boto3.client("secretsmanager", region_name=AWS_REGION)
-    raw = client.get_secret_value(SecretId=AWS_SECRET_ARN)
-    return json.loads(raw["SecretString"])
-
-
-# ========================
-# DATABASE CONNECTION
-# ========================
-def db_conn():
-    creds = get_credentials()
-    return mysql.connector.connect(
-        host=creds["DB_HOST"],
-        user=creds["DB_USER"],
-        password=creds["DB_PASSWORD"],
-        database=creds["DB_NAME"],
-        autocommit=True
-    )
+log = logging.getLogger(__name__)
 
 
 # ========================
 # FETCH VISITOR DATA
 # ========================
 def get_visitor(visitor_id: int):
-    conn = db_conn()
-    cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT * FROM visitors WHERE visitor_id=%s", (visitor_id,))
-    data = cur.fetchone()
-    cur.close()
-    conn.close()
-    return data
+    return db.fetch_one("SELECT * FROM visitors WHERE visitor_id=%s", (visitor_id,))
 
 
 # ========================
-# SAVE PHOTO TO S3 + UPDATE DB
+# SAVE PHOTO + UPDATE DB
 # ========================
-def save_photo_and_update(visitor, photo_bytes):
-    s3 = boto3.client("s3")
-    filename = (
+def photo_key(visitor):
+    return (
         f"visitor_photos/{visitor['from_company'].replace(' ', '_').lower()}/"
         f"{visitor['full_name'].replace(' ', '_').lower()}_{int(datetime.now().timestamp())}.jpg"
     )
 
-    s3.put_object(
-        Bucket=S3_BUCKET,
-        Key=filename,
-        Body=photo_bytes,
-        ContentType="image/jpeg"
-    )
-
-    photo_url = f"https://{S3_BUCKET}.s3.{AWS_REGION}.amazonaws.com/{filename}"
 
-    conn = db_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO visitor_identity (visitor_id, photo_url) VALUES (%s, %s)",
+def upload_photo(key, photo_bytes):
+    return photo_storage.put(key, photo_bytes, "image/jpeg")
+
+
+def record_pass(visitor, photo_url, company_name=None, thumbnail=None):
+    """
+    Store the photo URL, mark the pass issued and check the visitor in.
+    Safe to repeat for a retaken photo: the visit keeps one identity row.
+    """
+    with db.transaction() as cur:
+        cur.execute(
+            "SELECT visitor_id FROM visitor_identity WHERE visitor_id=%s LIMIT 1 FOR UPDATE",
+            (visitor["visitor_id"],)
+        )
+        if cur.fetchall():
+            cur.execute(
+                "UPDATE visitor_identity SET photo_url=%s WHERE visitor_id=%s",
+                (photo_url, visitor["visitor_id"])
+            )
+        else:
+            cur.execute(
+                "INSERT INTO visitor_identity (visitor_id, photo_url) VALUES (%s, %s)",
+                (visitor["visitor_id"], photo_url)
+            )
+        cur.execute(
+            "UPDATE visitors SET pass_generated=1, status='approved' WHERE visitor_id=%s",
+            (visitor["visitor_id"],)
+        )
+    read_cache.invalidate("visitors", visitor["company_id"])
+    occupancy.check_in(visitor, photo_url, company_name, thumbnail)
+
+
+def forget_photo(visitor, photo_url):
+    """Drop a URL whose upload failed, so nothing links to a missing object."""
+    db.execute(
+        "UPDATE visitor_identity SET photo_url=NULL WHERE visitor_id=%s AND photo_url=%s",
         (visitor["visitor_id"], photo_url)
     )
-    cur.execute(
-        "UPDATE visitors SET pass_generated=1, status='approved' WHERE visitor_id=%s",
-        (visitor["visitor_id"],)
-    )
-    cur.close()
-    conn.close()
-    return photo_url
+    occupancy.set_photo(visitor["company_id"], visitor["visitor_id"], None)
 
 
 # ========================
 # GENERATE VISITOR PASS IMAGE
 # ========================
-def generate_pass_image(visitor, photo_bytes):
-    face_img = Image.open(BytesIO(photo_bytes)).resize((230, 230))
-    W, H = 700, 1000
-    card = Image.new("RGB", (W, H), "white")
-    draw = ImageDraw.Draw(card)
-
-    try:
-        font_title = ImageFont.truetype(
-            "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 48)
-        font_text = ImageFont.truetype(
-            "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 32)
-    except:
-        font_title = ImageFont.load_default()
-        font_text = ImageFont.load_default()
-
-    try:
-        logo_data = requests.get(LOGO_URL).content
-        logo = Image.open(BytesIO(logo_data)).resize((200, 60))
-        card.paste(logo, (250, 40))
-    except:
-        pass
-
-    draw.text((230, 140), "Visitor Pass", fill="#4B2ECF", font=font_title)
-    card.paste(face_img, (235, 220))
-
-    y = 500
-    info = [
+def generate_pass_image(visitor, photo):
+    return render_pass(photo, [
         ("Name", visitor["full_name"]),
         ("Company", visitor["from_company"]),
         ("To Meet", visitor["person_to_meet"]),
         ("Visitor ID", f"#{visitor['visitor_id']}"),
         ("Email", visitor["email"]),
         ("Date", datetime.now().strftime("%d-%m-%Y %H:%M")),
-    ]
-
-    for key, val in info:
-        draw.text((140, y), f"{key}: {val}", font=font_text, fill="black")
-        y += 60
-
-    out = BytesIO()
-    card.save(out, format="JPEG")
-    return out.getvalue()
+    ])
 
 
 # ========================
-# SEND EMAIL SMTP
+# SEND EMAIL (QUEUED)
 # ========================
 def send_email(visitor, pass_image):
-    creds = get_credentials()
-
-    sender_email = creds["SMTP_USER"]
-    sender_password = creds["SMTP_PASSWORD"]
-    smtp_host = creds["SMTP_HOST"]
-    smtp_port = int(creds["SMTP_PORT"])
-    receiver_email = visitor["email"]
-
     subject = f"Visitor Pass - {visitor['full_name']}"
     body = f"""
 Hello {visitor['full_name']},
@@ -169,41 +109,131 @@ Thank You,
 Reception
 """
 
-    msg = MIMEMultipart()
-    msg["From"] = sender_email
-    msg["To"] = receiver_email
-    msg["Subject"] = subject
-    msg.attach(MIMEText(body, "plain"))
+    try:
+        mailer.send_email(
+            visitor["email"], subject, body,
+            attachments=[("visitor_pass.jpg", pass_image, "jpeg")],
+            idempotency_key=f"visitor-pass:{visitor['visitor_id']}",
+        )
+        return True, None
+    except Exception as e:
+        return False, str(e)
+
+
+# ========================
+# FINALIZATION PIPELINE
+# ========================
+# Upload, DB commit and pass render are independent once the photo URL is
+# known (it is derived from the key), so they run side by side. Upload and
+# DB commit go to the worker pool; the pass is rendered in the calling
+# thread, so it never queues behind slow uploads. Email goes out after the
+# DB commit without holding the page. Workers never touch st.*: each stage
+# reports into a plain dict the pass page reads.
+FINALIZE_WORKERS = 8
+FINALIZE_STAGES = ("upload", "database", "pass", "email")
+STAGE_LABELS = {
+    "upload": "Photo upload",
+    "database": "Visitor record",
+    "pass": "Pass image",
+    "email": "Pass email",
+}
+
+_finalize_executor = None
+_finalize_executor_lock = threading.Lock()
+
+
+def _get_finalize_executor():
+    global _finalize_executor
+    if _finalize_executor is None:
+        with _finalize_executor_lock:
+            if _finalize_executor is None:
+                _finalize_executor = ThreadPoolExecutor(
+                    max_workers=FINALIZE_WORKERS, thread_name_prefix="pass-finalize"
+                )
+    return _finalize_executor
+
+
+def _run_stage(status, name, fn, *args):
+    status[name] = "running"
+    try:
+        result = fn(*args)
+    except Exception as e:
+        status[name] = f"failed: {e}"
+        log.error("Pass %s failed: %s", name, e)
+        raise
+    status[name] = "done"
+    return result
 
-    attachment = MIMEApplication(pass_image, _subtype="jpeg")
-    attachment.add_header("Content-Disposition",
-                          "attachment", filename="visitor_pass.jpg")
-    msg.attach(attachment)
 
-    server = None
+def _upload_stage(visitor, key, url, photo_bytes, record):
+    try:
+        upload_photo(key, photo_bytes)
+    except Exception:
+        if record.exception() is None:
+            forget_photo(visitor, url)
+        raise
+
+
+def _email_stage(visitor, pass_image, record):
+    if record.exception() is not None:
+        raise RuntimeError("not sent, the visitor record was not saved")
+    sent, err = send_email(visitor, pass_image)
+    if not sent:
+        raise RuntimeError(err)
+
+
+def finalize_pass(visitor, photo, company_name=None):
+    """
+    Start every finalization stage for an ingested `photo` (see
+    photo_ingest) and return (pass image, status) as soon as the pass is
+    rendered. `status` maps each stage to "pending", "running", "done" or
+    "failed: ..." and keeps updating afterwards.
+
+    If the render fails the pass image is None, the email is skipped and
+    the call waits for the DB stage, so status says whether the visitor
+    was checked in anyway.
+    """
+    pool = _get_finalize_executor()
+    status = {name: "pending" for name in FINALIZE_STAGES}
+    key = photo_key(visitor)
+    url = photo_storage.get_storage().url(key)
+
+    record = pool.submit(_run_stage, status, "database", record_pass, visitor, url, company_name, photo.thumbnail)
+    pool.submit(_run_stage, status, "upload", _upload_stage, visitor, key, url, photo.master, record)
 
     try:
-        if smtp_port == 465:
-            server = smtplib.SMTP_SSL(smtp_host, smtp_port, timeout=15)
+        pass_image = _run_stage(status, "pass", generate_pass_image, visitor, photo.image)
+    except Exception:
+        status["email"] = "failed: not sent, no pass image"
+        futures_wait([record])
+        return None, status
+
+    pool.submit(_run_stage, status, "email", _email_stage, visitor, pass_image, record)
+    return pass_image, status
+
+
+def render_finalize_status():
+    status = st.session_state.get("finalize_status")
+    if not status:
+        return
+    if st.session_state.get("finalize_polling") and not finalize_pending():
+        # Everything settled: one full rerun replaces the polling fragment
+        st.session_state["finalize_polling"] = False
+        st.rerun()
+    for name in FINALIZE_STAGES:
+        state = status.get(name, "pending")
+        label = STAGE_LABELS[name]
+        if state == "done":
+            st.caption(f"✅ {label}")
+        elif state.startswith("failed"):
+            st.error(f"{label} {state}")
         else:
-            server = smtplib.SMTP(smtp_host, smtp_port, timeout=15)
-            server.starttls()
+            st.caption(f"⏳ {label}: {state}")
 
-        server.login(sender_email, sender_password)
-        server.sendmail(sender_email, receiver_email, msg.as_string())
 
-        return True, None
-
-    except smtplib.SMTPAuthenticationError:
-        return False, "SMTP Authentication Failed"
-    except Exception as e:
-        return False, str(e)
-    finally:
-        if server:
-            try:
-                server.quit()
-            except:
-                pass
+def finalize_pending():
+    status = st.session_state.get("finalize_status") or {}
+    return any(s in ("pending", "running") for s in status.values())
 
 
 # ========================
@@ -229,20 +259,31 @@ def render_identity_page():
             st.error("Please capture a photo.")
             return
 
-        photo_bytes = photo.getvalue()
-
-        save_photo_and_update(visitor, photo_bytes)
-        pass_image = generate_pass_image(visitor, photo_bytes)
-        sent, err = send_email(visitor, pass_image)
+        try:
+            photo = ingest_photo(photo.getvalue())
+        except OSError:
+            st.error("Could not read the captured photo. Please retake it.")
+            return
 
-        if sent:
-            st.success(f"Email sent to {visitor['email']}")
-        else:
-            st.error(f"Email failed: {err}")
+        pass_image, status = finalize_pass(
+            visitor, photo, st.session_state.get("company_name")
+        )
+        if pass_image is None:
+            if status["database"] == "done":
+                st.error(
+                    "The visitor is checked in, but the pass image could not be generated "
+                    f"({status['pass']}). Capture the photo again to retry."
+                )
+            else:
+                st.error(f"Could not generate the pass ({status['pass']}). The visitor was not checked in.")
+            st.session_state["finalize_status"] = status
+            render_finalize_status()
+            return
 
-        visitor["photo_bytes"] = photo_bytes
+        visitor["photo_bytes"] = photo.thumbnail
         st.session_state["pass_data"] = visitor
         st.session_state["pass_image"] = pass_image
+        st.session_state["finalize_status"] = status
         st.session_state["current_page"] = "visitor_pass"
         st.rerun()
 
@@ -273,6 +314,13 @@ def render_pass_page():
     """, unsafe_allow_html=True)
 
     st.write("")
+    polling = finalize_pending() and hasattr(st, "fragment")
+    st.session_state["finalize_polling"] = polling
+    if polling:
+        # Poll the background stages without rerunning the whole page
+        st.fragment(run_every=1)(render_finalize_status)()
+    else:
+        render_finalize_status()
     st.write("")
 
     col_space_left, col1, col2, col_space_right = st.columns([1, 2, 2, 1])
@@ -286,6 +334,7 @@ def render_pass_page():
             st.session_state["registration_step"] = "primary"
             st.session_state["pass_data"] = None
             st.session_state["pass_image"] = None
+            st.session_state["finalize_status"] = None
 
             st.session_state["current_page"] = "visitor_dashboard"
             st.rerun()
@@ -1,54 +1,19 @@
 import streamlit as st
 import os
-import mysql.connector
 import bcrypt
-import boto3
-import json
-import smtplib
 import random
 import string
-from email.mime.text import MIMEText
 from time import sleep
-from typing import Dict, Any, Optional
+
+import db
+from mailer import send_email
 
 # ======================================================
 # CONFIG
 # ======================================================
-AWS_REGION = "ap-south-1"
-AWS_SECRET_NAME = "arn:aws:secretsmanager:ap-south-1:034362058776:secret:Wheelbrand-zM6npS"
 LOGO_PATH = "https://raw.githubusercontent.com/ZODOPT-Tech/Wheelbrand/main/images/zodopt.png"
 HEADER_GRADIENT = "linear-gradient(90deg, #4B2ECF, #7A42FF)"
 MIN_PASSWORD_LENGTH = 8
-DEFAULT_DB_PORT = 3306
-
-# ======================================================
-# AWS SECRET MANAGER
-# ======================================================
-@st.cache_resource
-def get_db_credentials() -> Dict[str, str]:
-    try:
-        client = boto3.client("secretsmanager", region_name=AWS_REGION)
-        resp = client.get_secret_value(SecretId=AWS_SECRET_NAME)
-        return json.loads(resp["SecretString"])
-    except:
-        st.error("Could not load DB credentials.")
-        st.stop()
-
-@st.cache_resource
-def get_fast_connection():
-    creds = get_db_credentials()
-    try:
-        return mysql.connector.connect(
-            host=creds["DB_HOST"],
-            user=creds["DB_USER"],
-            password=creds["DB_PASSWORD"],
-            database=creds["DB_NAME"],
-            port=DEFAULT_DB_PORT,
-            autocommit=True,
-        )
-    except:
-        st.error("Database connection failed.")
-        st.stop()
 
 # ======================================================
 # SECURITY
@@ -64,31 +29,6 @@ def set_auth_view(view: str):
     sleep(0.05)
     st.rerun()
 
-# ======================================================
-# SMTP EMAIL FUNCTION
-# ======================================================
-def send_email(to_email: str, subject: str, body: str) -> bool:
-    creds = get_db_credentials()
-    try:
-        msg = MIMEText(body, "plain")
-        msg["Subject"] = subject
-        msg["From"] = creds["SMTP_USER"]
-        msg["To"] = to_email
-
-        if int(creds["SMTP_PORT"]) == 465:
-            server = smtplib.SMTP_SSL(creds["SMTP_HOST"], int(creds["SMTP_PORT"]))
-        else:
-            server = smtplib.SMTP(creds["SMTP_HOST"], int(creds["SMTP_PORT"]))
-            server.starttls()
-
-        server.login(creds["SMTP_USER"], creds["SMTP_PASSWORD"])
-        server.sendmail(creds["SMTP_USER"], to_email, msg.as_string())
-        server.quit()
-        return True
-    except Exception as e:
-        st.error(f"Email send failed: {e}")
-        return False
-
 # ======================================================
 # DB FUNCTIONS
 # ======================================================
@@ -114,12 +54,6 @@ def create_company_and_admin(conn, cname, aname, email, hashed):
             VALUES (%s,%s,%s,%s,1)
         """, (cid, aname, email, hashed))
         conn.commit()
-
-        # Send welcome email
-        subject = "Welcome to ZODOPT"
-        body = f"Hello {aname},\n\nYour admin account has been created successfully.\n\nEmail: {email}"
-        send_email(email, subject, body)
-
         return True
     except:
         conn.rollback()
@@ -163,7 +97,6 @@ def verify_forgot_code(conn, admin_id, code) -> bool:
 # UI COMPONENTS
 # ======================================================
 def render_admin_register_view():
-    conn = get_fast_connection()
     with st.form("reg_form"):
         cname = st.text_input("Company Name")
         aname = st.text_input("Admin Name")
@@ -174,7 +107,14 @@ def render_admin_register_view():
 
         if sub:
             if p1 == p2 and len(p1) >= MIN_PASSWORD_LENGTH:
-                if create_company_and_admin(conn, cname, aname, email, hash_password(p1)):
+                with db.get_connection() as conn:
+                    created = create_company_and_admin(conn, cname, aname, email, hash_password(p1))
+                if created:
+                    # Queued after the connection is back in the pool
+                    send_email(
+                        email, "Welcome to ZODOPT",
+                        f"Hello {aname},\n\nYour admin account has been created successfully.\n\nEmail: {email}",
+                    )
                     st.success("Registration successful. Welcome email sent!")
                     set_auth_view("admin_login")
                 else:
@@ -187,14 +127,14 @@ def render_admin_register_view():
 
 
 def render_existing_admin_login_view():
-    conn = get_fast_connection()
     with st.form("login_form"):
         email = st.text_input("Email").lower()
         pw = st.text_input("Password", type="password")
         sub = st.form_submit_button("Sign In →")
 
         if sub:
-            user = get_admin_by_email(conn, email)
+            with db.get_connection() as conn:
+                user = get_admin_by_email(conn, email)
             if user and check_password(pw, user["password_hash"]):
                 st.session_state["admin_logged_in"] = True
                 st.session_state["admin_id"] = user["id"]
@@ -218,16 +158,15 @@ def render_admin_dashboard_home_view():
 
 
 def render_forgot_password_view():
-    conn = get_fast_connection()
-
     if "reset_uid" not in st.session_state:
         with st.form("fp_form"):
             email = st.text_input("Enter Email").lower()
             sub = st.form_submit_button("Verify Email")
             if sub:
-                user = get_admin_by_email(conn, email)
+                with db.get_connection() as conn:
+                    user = get_admin_by_email(conn, email)
+                    code = create_forgot_password_code(conn, user["id"]) if user else None
                 if user:
-                    code = create_forgot_password_code(conn, user["id"])
                     send_email(email, "ZODOPT Password Reset Code", f"Your verification code is: {code}")
                     st.session_state["reset_uid"] = user["id"]
                     st.session_state["verified"] = False
@@ -241,7 +180,9 @@ def render_forgot_password_view():
                 code_input = st.text_input("Enter 6-digit Verification Code").upper()
                 sub = st.form_submit_button("Verify Code")
                 if sub:
-                    if verify_forgot_code(conn, st.session_state["reset_uid"], code_input):
+                    with db.get_connection() as conn:
+                        verified = verify_forgot_code(conn, st.session_state["reset_uid"], code_input)
+                    if verified:
                         st.session_state["verified"] = True
                         st.success("Code verified! You can now reset your password.")
                         st.rerun()
@@ -253,7 +194,8 @@ def render_forgot_password_view():
                 p2 = st.text_input("Confirm Password", type="password")
                 sub = st.form_submit_button("Reset Password")
                 if sub and p1 == p2 and len(p1) >= MIN_PASSWORD_LENGTH:
-                    update_admin_password_directly(conn, st.session_state["reset_uid"], hash_password(p1))
+                    with db.get_connection() as conn:
+                        update_admin_password_directly(conn, st.session_state["reset_uid"], hash_password(p1))
                     del st.session_state["reset_uid"]
                     del st.session_state["verified"]
                     st.success("Password updated successfully!")